@@ -0,0 +1,202 @@
+"""
+Benchmarks for the acquisition, DSP and render hot paths.
+
+Runs without hardware: the sensor is fed by a synthetic signal through a
+FifoBus and the display renders to a luma dummy device. Results are saved
+as JSON so runs from different commits can be compared.
+
+Usage:
+    python benchmark.py -o bench.json
+    python benchmark.py -o new.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import scipy
+from PIL import Image, ImageDraw
+from luma.core.device import dummy
+
+import display
+from max30102 import MAX30102, HeartRateMonitor, hrcalc
+from max30102.synthetic import generate_ppg, to_fifo_bus
+
+# Fail --compare when a benchmark gets this much slower
+REGRESSION_THRESHOLD = 0.10
+# Seconds per heart animation frame, see pulse.ANIMATION_INTERVAL
+FRAME_TIME = 0.15
+
+
+def bench(func, min_time=0.5, min_rounds=5, warmup=2):
+    """
+    Time `func` repeatedly.
+
+    Runs at least `min_rounds` rounds and at least `min_time` seconds.
+
+    Returns:
+        dict: 'min', 'median', 'mean', 'stddev' in microseconds and 'rounds'
+    """
+    for _ in range(warmup):
+        func()
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_rounds or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - t0) * 1e6)
+
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'rounds': len(times),
+    }
+
+
+def make_sensor(signal):
+    """MAX30102 on a FifoBus that never runs dry during a benchmark."""
+    return MAX30102(bus=to_fifo_bus(signal, loop=True))
+
+
+def acquisition_benchmarks(signal):
+    sensor = make_sensor(signal)
+    yield 'max30102.read_fifo', lambda: sensor.read_fifo()
+    yield 'max30102.read_fifo_burst[31]', lambda: sensor.read_fifo_burst(31)
+
+    hrm = HeartRateMonitor(bus=sensor.bus)
+    # prime the window so every drain runs the full DSP path
+    while not hrm.ir_data.full:
+        hrm._drain(sensor)
+    yield 'heartrate_monitor.drain', lambda: hrm._drain(sensor)
+
+
+def dsp_benchmarks(signal):
+    ir = signal['ir'].astype(np.float64)
+    red = signal['red'].astype(np.float64)
+    window_size = hrcalc.window_samples(hrcalc.WINDOW_TIME)
+    hrv_size = hrcalc.window_samples(hrcalc.HRV_WINDOW_TIME)
+
+    for size in (window_size, hrv_size, 90000):
+        window = ir[:size]
+        yield ('hrcalc.filter_and_find_peaks[{0}]'.format(size),
+               lambda window=window: hrcalc._filter_and_find_peaks(window))
+
+    ir_window = ir[:window_size]
+    red_window = red[:window_size]
+    yield 'hrcalc.calc_hr_and_spo2', lambda: hrcalc.calc_hr_and_spo2(ir_window, red_window)
+
+    peaks, _ = hrcalc._filter_and_find_peaks(ir[:hrv_size])
+    yield 'hrcalc.calc_hrv_metrics', lambda: hrcalc.calc_hrv_metrics(peaks)
+
+
+def render_benchmarks(signal):
+    image = Image.new('RGB', (128, 128))
+    draw = ImageDraw.Draw(image)
+    window_size = hrcalc.window_samples(hrcalc.WINDOW_TIME)
+    waveform = signal['ir'][:window_size]
+
+    yield 'display.draw_heart', lambda: display.draw_heart(draw, 15, 15, 9, (0, 0, 255))
+    yield 'display.draw_ekg', lambda: display.draw_ekg(
+        draw, waveform, bounds=(14, 45, 100, 40), color=(0, 255, 255))
+
+    pulse = display.PulseDisplay(device=dummy(width=128, height=128, mode='RGB'))
+    yield 'display.heart_sprite', lambda: pulse.image.paste(
+        pulse._heart_sprite(3), display.HEART_BOX[:2])
+    hrv = {'valid': True, 'rmssd': 42.1, 'pnn50': 12.5, 'mean_hr': 71.0}
+    ir = signal['ir']
+    frame_samples = hrcalc.window_samples(FRAME_TIME)
+    offset = [0]
+
+    def frame():
+        # next heart frame and a waveform window that has moved on
+        pulse.tick()
+        offset[0] = (offset[0] + frame_samples) % (len(ir) - window_size)
+        pulse.update_display(
+            bpm=71, spo=97.5, hrv_status='ready', hrv_results=hrv,
+            raw_data=ir[offset[0]:offset[0] + window_size])
+
+    def full_redraw():
+        # as after test_display(), every region is repainted and sent
+        pulse._drawn = None
+        frame()
+
+    yield 'display.update_display', frame
+    yield 'display.update_display[full]', full_redraw
+
+
+def run(min_time):
+    # one hour of signal, long enough for the 90000-sample window
+    signal = generate_ppg(3600, seed=0)
+
+    results = {}
+    for group in (acquisition_benchmarks, dsp_benchmarks, render_benchmarks):
+        for name, func in group(signal):
+            results[name] = bench(func, min_time=min_time)
+            print("{0:<40} {1:>12.1f} us".format(name, results[name]['median']))
+
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Print median timings against a baseline run.
+
+    Returns:
+        list: Names of benchmarks that regressed by more than `threshold`
+    """
+    regressions = []
+    print("\n{0:<40} {1:>12} {2:>12} {3:>8}".format("benchmark", "baseline", "current", "change"))
+    for name, stats in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print("{0:<40} {1:>12} {2:>12.1f}".format(name, "-", stats['median']))
+            continue
+        change = stats['median'] / old['median'] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{0:<40} {1:>12.1f} {2:>12.1f} {3:>+7.1%}{4}".format(
+            name, old['median'], stats['median'], change, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pulse oximeter hot paths")
+    parser.add_argument("-o", "--output", help="save results as JSON")
+    parser.add_argument("-c", "--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("-t", "--min-time", type=float, default=0.5,
+                        help="minimum seconds spent per benchmark, default 0.5")
+    args = parser.parse_args(argv)
+
+    current = run(args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(current, baseline):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,10 +7,12 @@ including heart animation and BPM/SpO2 visualization.
 
 import math
 import time
+from collections import OrderedDict
+import numpy as np
 from luma.core.interface.serial import spi
 from luma.core.render import canvas
 from luma.oled.device import ssd1351
-from PIL import ImageFont
+from PIL import Image, ImageDraw, ImageFont
 
 FONT_LARGE = ImageFont.truetype(
     "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 12
@@ -19,6 +21,32 @@ FONT_SMALL = ImageFont.truetype(
     "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 8
 )
 
+# Screen regions redrawn independently, (left, top, right, bottom)
+HEART_BOX = (2, 4, 30, 30)
+SPO2_ICON_BOX = (69, 8, 90, 30)
+BPM_BOX = (35, 5, 69, 20)
+SPO2_BOX = (90, 5, 128, 20)
+EKG_BOUNDS = (14, 45, 100, 40)   # x, y, width, height passed to draw_ekg
+EKG_BOX = (13, 44, 116, 86)      # EKG_BOUNDS plus the line width
+HRV_BOX = (0, 88, 128, 128)
+
+# Heart animation
+HEART_FRAMES = 20      # frames per beat cycle, one sprite each
+HEART_BASE_SCALE = 7
+
+SPRITE_CACHE_SIZE = 32
+TEXT_CACHE_SIZE = 128
+
+
+def heart_scale(frame):
+    """Scale of the pulsing heart for an animation frame."""
+    beat_cycle = (frame % HEART_FRAMES) / float(HEART_FRAMES)
+    if beat_cycle < 0.3:
+        pulse = 1.0 + (beat_cycle / 0.3) * 0.7
+    else:
+        pulse = 1.5 - ((beat_cycle - 0.3) / 0.7) * 0.7
+    return HEART_BASE_SCALE * pulse
+
 def draw_heart(draw, cx, cy, scale, fill_color):
     """
     Draw a heart shape at the specified position.
@@ -75,7 +103,7 @@ def draw_spo2_symbol(draw, center_x, center_y, size, fill_color, text_color):
     draw.text((text_x, text_y), "O₂", fill=text_color, font=FONT_LARGE)
 
 
-def draw_hrv(draw, hrv_status, hrv_results):
+def draw_hrv(draw, hrv_status, hrv_results, text=None):
     """
     Draw HRV status and results.
     
@@ -83,16 +111,22 @@ def draw_hrv(draw, hrv_status, hrv_results):
         draw: ImageDraw object
         hrv_status: Current HRV state ('idle', 'collecting', 'ready')
         hrv_results: Either percentage (float) for 'collecting' or dict for 'ready'
+        text: Optional function (xy, text, fill, font) used instead of
+            draw.text, e.g. a cached blitter
     """
+    if text is None:
+        def text(xy, string, fill, font):
+            draw.text(xy, string, fill=fill, font=font)
+
     if hrv_status == 'idle':
-        draw.text((25, 100), "NO FINGER", fill=(0, 255, 0), font=FONT_LARGE)
-        draw.text((28, 110), "DETECTED", fill=(0, 255, 0), font=FONT_LARGE)
+        text((25, 100), "NO FINGER", (0, 255, 0), FONT_LARGE)
+        text((28, 110), "DETECTED", (0, 255, 0), FONT_LARGE)
 
     elif hrv_status == 'collecting':
         # hrv_results is a percentage number
         percentage = hrv_results if hrv_results is not None else 0
         hrv_text = f"HRV Calculations: {percentage}%"
-        draw.text((15, 95), hrv_text, fill=(0, 255, 0), font=FONT_SMALL)
+        text((15, 95), hrv_text, (0, 255, 0), FONT_SMALL)
         
         # Draw loading bar
         bar_x = 15
@@ -143,94 +177,258 @@ def draw_hrv(draw, hrv_status, hrv_results):
                 pnn_level = "HIGH"
                 pnn_color = (0, 255, 0)
             
-            draw.text((15, 90), f"RMSSD: {rmssd_level}", fill=rmssd_color, font=FONT_SMALL)
-            draw.text((15, 100), f"{rmssd}ms", fill=(255, 255, 255), font=FONT_SMALL)
-            draw.text((15, 110), f"pNN50: {pnn_level}", fill=pnn_color, font=FONT_SMALL)
-            draw.text((15, 120), f"{pnn50}%", fill=(255, 255, 255), font=FONT_SMALL)
+            text((15, 90), f"RMSSD: {rmssd_level}", rmssd_color, FONT_SMALL)
+            text((15, 100), f"{rmssd}ms", (255, 255, 255), FONT_SMALL)
+            text((15, 110), f"pNN50: {pnn_level}", pnn_color, FONT_SMALL)
+            text((15, 120), f"{pnn50}%", (255, 255, 255), FONT_SMALL)
 
-def draw_ekg(draw, data, bounds, color, finger_present=True):
+def ekg_points(data, bounds):
     """
-    Draw an EKG-like waveform.
-    
+    Screen coordinates of the EKG-like waveform for `data`.
+
     Args:
-        draw: ImageDraw object
-        data: List of numerical values (raw sensor data)
+        data: Array or list of numerical values (raw sensor data), e.g. a
+            RingBuffer view, which is used without copying
         bounds: Tuple (x, y, width, height) of the drawing area
-        color: RGB tuple for line color
-        finger_present: Whether finger is detected (controls display)
+
+    Returns:
+        ndarray: (n, 2) array of x, y points, or None if there is nothing
+            to draw
     """
     x_start, y_start, width, height = bounds
     y_center = y_start + height / 2
-    
-    if not finger_present:
-        return
-    
+
     if len(data) < 6:
-        return
+        return None
     
-    # smoothing for cleaner signal
-    smoothed = []
-    for i in range(2, len(data) - 2):
-        val = (data[i-2] + data[i-1] + data[i] + data[i+1] + data[i+2]) / 5.0
-        smoothed.append(val)
-        
-    # Calculate derivative (inverted) to turn rapid drops into positive spikes
-    derivative = []
-    for i in range(len(smoothed) - 1):
-        diff = smoothed[i] - smoothed[i+1]
-        derivative.append(diff)
+    # 5-sample moving average for cleaner signal
+    smoothed = np.convolve(np.asarray(data), np.ones(5), 'valid') / 5.0
 
-    if not derivative:
-        return
+    # Calculate derivative (inverted) to turn rapid drops into positive spikes
+    derivative = -np.diff(smoothed)
 
     # Auto-scale logic
-    data_to_plot = derivative
-    min_val = min(data_to_plot)
-    max_val = max(data_to_plot)
+    min_val = derivative.min()
+    max_val = derivative.max()
     val_range = max_val - min_val
     
     # if signal is too small, don't draw
     if val_range < 200:
-        return
+        return None
         
-    points = []
-    step_x = width / (len(data_to_plot) - 1) if len(data_to_plot) > 1 else 0
+    step_x = width / (len(derivative) - 1) if len(derivative) > 1 else 0
+
+    points = np.empty((len(derivative), 2))
+    points[:, 0] = x_start + np.arange(len(derivative)) * step_x
+    norm = np.clip((derivative - min_val) / val_range - 0.5, -0.5, 0.5)
+    points[:, 1] = y_center - norm * height * 0.9
+    return points
+
+
+def draw_ekg(draw, data, bounds, color, finger_present=True):
+    """
+    Draw an EKG-like waveform.
     
-    for i, val in enumerate(data_to_plot):
-        x = x_start + (i * step_x)
-        
-        norm = (val - min_val) / val_range - 0.5
-        norm = max(-0.5, min(0.5, norm))
-        
-        y = y_center - (norm * height * 0.9)
-        points.append((x, y))
-        
-    # Draw with thicker line for better visibility
-    draw.line(points, fill=color, width=2)
+    Args:
+        draw: ImageDraw object
+        data: Array or list of numerical values (raw sensor data), e.g. a
+            RingBuffer view, which is used without copying
+        bounds: Tuple (x, y, width, height) of the drawing area
+        color: RGB tuple for line color
+        finger_present: Whether finger is detected (controls display)
+    """
+    if not finger_present:
+        return
+
+    points = ekg_points(data, bounds)
+    if points is not None:
+        # Draw with thicker line for better visibility
+        draw.line(points.ravel().tolist(), fill=color, width=2)
+
+
+class SpriteCache(object):
+    """
+    Bounded LRU cache of pre-rendered screen regions.
+
+    A sprite is painted once onto a black image the size of its box and
+    afterwards only pasted, so redrawing it costs a memory copy.
+    """
+
+    def __init__(self, maxsize=SPRITE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._sprites = OrderedDict()
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def get(self, key, box, paint):
+        """
+        Get a sprite, rendering it on first use.
+
+        Args:
+            key: Hashable description of what is drawn
+            box: (left, top, right, bottom) screen region the sprite covers
+            paint: Function (draw, left, top) drawing the sprite content in
+                screen coordinates minus (left, top)
+
+        Returns:
+            PIL.Image.Image: RGB sprite of the box size
+        """
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        left, top, right, bottom = box
+        sprite = Image.new('RGB', (right - left, bottom - top))
+        paint(ImageDraw.Draw(sprite), left, top)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.maxsize:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def clear(self):
+        self._sprites.clear()
+
+
+class TextCache(object):
+    """
+    Bounded LRU cache of rasterised text.
+
+    Stores the FreeType coverage mask of each (text, font) pair. The colour
+    is applied when the mask is blitted, so one mask serves every colour.
+    """
+
+    def __init__(self, maxsize=TEXT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._masks = OrderedDict()
+
+    def __len__(self):
+        return len(self._masks)
+
+    def get(self, text, font):
+        """
+        Get the mask of `text`, rasterising it on first use.
+
+        Returns:
+            tuple: ('L' mask image, (dx, dy) offset of the mask from the
+                text position)
+        """
+        key = (text, font)
+        entry = self._masks.get(key)
+        if entry is not None:
+            self._masks.move_to_end(key)
+            return entry
+
+        left, top, right, bottom = font.getbbox(text)
+        mask = Image.new('L', (max(right - left, 0), max(bottom - top, 0)))
+        ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+        entry = (mask, (left, top))
+        self._masks[key] = entry
+        if len(self._masks) > self.maxsize:
+            self._masks.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._masks.clear()
+
+
+def blit_text(image, xy, text, fill, font, cache):
+    """
+    Draw text like ImageDraw.text() using a TextCache.
+
+    Args:
+        image: RGB image to draw on
+        xy: Integer (x, y) text position
+        text: String to draw
+        fill: RGB tuple for the text colour
+        font: ImageFont to render with
+        cache: TextCache holding the rasterised masks
+    """
+    mask, (dx, dy) = cache.get(text, font)
+    image.paste(fill, (xy[0] + dx, xy[1] + dy), mask)
+
+
+class DirtyRegions(object):
+    """
+    luma framebuffer strategy that only sends regions marked as changed.
+
+    Instead of diffing whole frames, the drawing code marks the boxes it
+    redrew and redraw() yields just those, so the device sets its column/row
+    address window to each box and transfers only its pixels. Boxes are in
+    unrotated image coordinates.
+    """
+
+    def __init__(self):
+        self.boxes = []
+        self.full = True
+
+    @property
+    def dirty(self):
+        return self.full or bool(self.boxes)
+
+    def mark(self, box):
+        """Send `box` with the next frame."""
+        self.boxes.append(box)
+
+    def invalidate(self):
+        """Send the whole screen with the next frame."""
+        self.full = True
+
+    def redraw(self, image):
+        """Yield (image part, bounding box) for every changed region."""
+        if self.full:
+            yield image, (0, 0) + image.size
+        else:
+            for box in self.boxes:
+                yield image.crop(box), box
+        self.full = False
+        self.boxes = []
 
 
 class PulseDisplay:
     """Manages the OLED display for pulse oximeter readings."""
 
-    def __init__(self):
-        """Initialize the SPI connection and display device."""
-        serial = spi(port=0, device=0, gpio_DC=25, gpio_RST=27)
-        self.device = ssd1351(serial, width=128, height=128)
+    def __init__(self, device=None):
+        """
+        Initialize the SPI connection and display device.
+
+        Args:
+            device: Optional luma device to draw on instead of the SSD1351,
+                e.g. luma.core.device.dummy for benchmarks
+        """
+        self.regions = DirtyRegions()
+        if device is None:
+            serial = spi(port=0, device=0, gpio_DC=25, gpio_RST=27)
+            device = ssd1351(serial, width=128, height=128, framebuffer=self.regions)
+        elif hasattr(device, 'framebuffer'):
+            device.framebuffer = self.regions
+        self.device = device
         self.frame = 0
         self.current_bpm = 0
         self.current_spo = 0
 
+        # persistent back buffer, only changed regions are repainted
+        self.image = Image.new(device.mode, device.size)
+        self.draw = ImageDraw.Draw(self.image)
+        self._drawn = None
+        self.sprites = SpriteCache()
+        self.text_cache = TextCache()
+
 
     def update_display(self, bpm=None, spo=None, hrv_status='idle', hrv_results=None, raw_data=None):
         """
         Update display with new BPM and SpO2 values.
 
+        Only the regions whose content changed since the last call are
+        repainted and sent to the device.
+
         Args:
             bpm: Heart rate in beats per minute
             spo: Blood oxygen saturation percentage
             hrv_status: Status of HRV collection
             hrv_results: HRV results or progress
-            raw_data: Optional list of raw sensor values for EKG plot
+            raw_data: Optional array of raw sensor values for EKG plot
         """
         if bpm is not None and spo is not None:
             self.current_bpm = bpm
@@ -239,52 +437,83 @@ class PulseDisplay:
         # Use provided buffer or empty
         waveform = raw_data if raw_data is not None else []
 
-        # Calculate pulsing heart scale
-        beat_cycle = (self.frame % 20) / 20.0
-        if beat_cycle < 0.3:
-            pulse = 1.0 + (beat_cycle / 0.3) * 0.7
-        else:
-            pulse = 1.5 - ((beat_cycle - 0.3) / 0.7) * 0.7
-
-        base_scale = 7
-        heart_scale = base_scale * pulse
-
-        with canvas(self.device) as draw:
-            # Draw heart icon and BPM
-            heart_x = 15
-            heart_y = 15
-            draw_heart(draw, heart_x, heart_y, heart_scale, fill_color=(0, 0, 255))
-
-            bpm_text = f"{int(self.current_bpm)}"
-            draw.text((35, 5), bpm_text, fill=(0, 0, 255), font=FONT_LARGE)
-            draw.text((35, 20), "BPM", fill=(0, 0, 255), font=FONT_SMALL)
-
-            # Draw SpO2 symbol and value
-            spo_symbol_x = 75
-            spo_symbol_y = 20
-            draw_spo2_symbol(
-                draw, spo_symbol_x, spo_symbol_y,
-                size=10, fill_color=(255, 0, 0), text_color=(255, 255, 255)
-            )
-            spo_text = f"{round(float(self.current_spo), 2)}"
-            draw.text((90, 5), spo_text, fill=(255, 0, 0), font=FONT_LARGE)
-            draw.text((95, 20), "spo", fill=(255, 0, 0), font=FONT_SMALL)
-            
-            # Draw EKG Waveform in center (only when finger is present)
-            finger_present = self.current_bpm > 0
-            if waveform:
-                draw_ekg(
-                    draw, 
-                    waveform, 
-                    bounds=(14, 45, 100, 40),
-                    color=(0, 255, 255),
-                    finger_present=finger_present
-                )
-
-            draw_hrv(draw, hrv_status, hrv_results)
-
-
-        time.sleep(0.05)
+        draw = self.draw
+        if self._drawn is None:
+            self._draw_static()
+
+        # Pulsing heart, one pre-rendered sprite per animation frame
+        heart_frame = self.frame % HEART_FRAMES
+        self._update_region(
+            HEART_BOX, 'heart', heart_frame,
+            lambda: self.image.paste(self._heart_sprite(heart_frame), HEART_BOX[:2]))
+
+        bpm_text = f"{int(self.current_bpm)}"
+        self._update_region(
+            BPM_BOX, 'bpm', bpm_text,
+            lambda: self._text((35, 5), bpm_text, (0, 0, 255), FONT_LARGE))
+
+        spo_text = f"{round(float(self.current_spo), 2)}"
+        self._update_region(
+            SPO2_BOX, 'spo', spo_text,
+            lambda: self._text((90, 5), spo_text, (255, 0, 0), FONT_LARGE))
+
+        # Draw EKG Waveform in center (only when finger is present)
+        finger_present = self.current_bpm > 0
+        points = ekg_points(waveform, EKG_BOUNDS) if finger_present else None
+
+        def paint_ekg():
+            if points is not None:
+                draw.line(points.ravel().tolist(), fill=(0, 255, 255), width=2)
+
+        # an empty box stays empty however the raw window changes
+        self._update_region(
+            EKG_BOX, 'ekg', points.tobytes() if points is not None else None, paint_ekg)
+
+        self._update_region(
+            HRV_BOX, 'hrv', (hrv_status, hrv_results),
+            lambda: draw_hrv(draw, hrv_status, hrv_results, text=self._text))
+
+        if self.regions.dirty:
+            self.device.display(self.image)
+
+    def _draw_static(self):
+        """Draw the labels and symbols that never change."""
+        draw = self.draw
+        draw.rectangle((0, 0) + self.image.size, fill=(0, 0, 0))
+        self._text((35, 20), "BPM", (0, 0, 255), FONT_SMALL)
+        spo2_icon = self.sprites.get(
+            'spo2', SPO2_ICON_BOX,
+            lambda draw, left, top: draw_spo2_symbol(
+                draw, 75 - left, 20 - top,
+                size=10, fill_color=(255, 0, 0), text_color=(255, 255, 255)))
+        self.image.paste(spo2_icon, SPO2_ICON_BOX[:2])
+        self._text((95, 20), "spo", (255, 0, 0), FONT_SMALL)
+        self._drawn = {}
+        self.regions.invalidate()
+
+    def _text(self, xy, text, fill, font):
+        """Draw text on the back buffer through the text cache."""
+        blit_text(self.image, xy, text, fill, font, self.text_cache)
+
+    def _heart_sprite(self, heart_frame):
+        """Pre-rendered heart for one animation frame."""
+        scale = heart_scale(heart_frame)
+        return self.sprites.get(
+            ('heart', heart_frame), HEART_BOX,
+            lambda draw, left, top: draw_heart(
+                draw, 15 - left, 15 - top, scale, fill_color=(0, 0, 255)))
+
+    def _update_region(self, box, name, state, paint):
+        """Repaint `box` with `paint()` and mark it dirty if `state` changed."""
+        if name in self._drawn and self._drawn[name] == state:
+            return
+        self.draw.rectangle((box[0], box[1], box[2] - 1, box[3] - 1), fill=(0, 0, 0))
+        paint()
+        self._drawn[name] = state
+        self.regions.mark(box)
+
+    def tick(self):
+        """Advance the heart animation by one frame."""
         self.frame += 1
 
 
@@ -292,6 +521,9 @@ class PulseDisplay:
         """Test the display with cycling colors (for debugging only)."""
         i = self.frame
         colors = [(255, 255, 255), (255, 0, 0), (0, 255, 0), (128, 128, 128)]
+        # canvas() draws a new frame, send all of it and repaint afterwards
+        self.regions.invalidate()
+        self._drawn = None
 
         with canvas(self.device) as draw:
             draw.rectangle(
@@ -307,6 +539,8 @@ class PulseDisplay:
 
     def cleanup(self):
         """Clean up display resources."""
+        # clear() on cleanup only reaches the panel if every region is sent
+        self.regions.invalidate()
         self.device.cleanup()
         print("\nDisplay cleaned up")
 
@@ -1,3 +1,8 @@
 ﻿from .max30102 import MAX30102
+from .config import SensorConfig
 from .heartrate_monitor import HeartRateMonitor
+from .analyzer import PulseAnalyzer
+from .interrupt import InterruptPin, FakeInterruptPin, GPIOInterruptPin
+from .ringbuffer import RingBuffer
+from .replay import RecordingBus, ReplayBus, FifoBus
 from . import hrcalc
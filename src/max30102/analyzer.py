@@ -0,0 +1,125 @@
+"""
+Single-pass HR, SpO2 and HRV analysis of the sensor stream.
+
+Every incoming batch is bandpass filtered and searched for beats exactly
+once. The detected beats go into one shared beat list that the rolling
+heart rate, the SpO2 segmentation and the HRV metrics are all derived from,
+so nothing is re-filtered when a window slides or an HRV collection ends.
+
+Beats are detected on the inverted IR signal, i.e. on the systolic
+absorption pulse. Its maxima are the one sharp feature per beat after the
+causal filter, while the maxima of the IR itself are split between the
+diastolic level and the filter's rebound after systole and make the RR
+intervals alternate.
+"""
+
+import numpy as np
+
+from . import hrcalc
+from .ringbuffer import RingBuffer
+
+
+class PulseAnalyzer(object):
+    """
+    Incremental PPG analysis engine.
+
+    Beat positions are absolute sample numbers since the last reset(), see
+    sample_count. They lag the raw signal by the causal filter's group delay,
+    which cancels out in every beat-to-beat interval.
+    """
+
+    def __init__(self, sample_freq=hrcalc.SAMPLE_FREQ, window=None,
+                 history=2 * hrcalc.HRV_WINDOW_TIME):
+        """
+        Args:
+            sample_freq: Sampling frequency in Hz
+            window: HR/SpO2 window length in samples (default WINDOW_TIME)
+            history: Seconds of beats kept for HRV, at the highest heart
+                rate the detector accepts
+        """
+        self.sample_freq = sample_freq
+        self.window = window or hrcalc.window_samples(hrcalc.WINDOW_TIME, sample_freq)
+        self.filter = hrcalc.StreamingBandpass(sample_freq)
+        self.detector = hrcalc.StreamingPeakDetector(sample_freq, window=self.window)
+
+        # raw window for SpO2, finger detection and the display waveform
+        self.ir_data = RingBuffer(self.window, dtype=np.uint32)
+        self.red_data = RingBuffer(self.window, dtype=np.uint32)
+        self.beats = RingBuffer(int(history / hrcalc.MIN_BEAT_INTERVAL) + 1)
+
+    @property
+    def sample_count(self):
+        """Samples analysed since the last reset."""
+        return self.detector.sample_count
+
+    def reset(self):
+        """Drop all samples and beats and restart sample numbering at 0."""
+        self.filter.reset()
+        self.detector.reset()
+        self.ir_data.clear()
+        self.red_data.clear()
+        self.beats.clear()
+
+    def update(self, ir, red):
+        """
+        Analyse a batch of new samples.
+
+        Args:
+            ir: Array of new infrared LED readings
+            red: Array of new red LED readings
+
+        Returns:
+            ndarray: Positions of the beats confirmed by this batch
+        """
+        self.ir_data.extend(ir)
+        self.red_data.extend(red)
+        # blood absorbs light at systole, the pulse is a dip in the IR
+        new_beats = self.detector.update(-self.filter.process(ir))
+        self.beats.extend(new_beats)
+        return new_beats
+
+    def beats_between(self, start, stop=None):
+        """
+        Beat positions in the sample range [start, stop).
+
+        Returns:
+            ndarray: Read-only view of the shared beat list
+        """
+        beats = self.beats.view()
+        lo = np.searchsorted(beats, start)
+        hi = len(beats) if stop is None else np.searchsorted(beats, stop)
+        return beats[lo:hi]
+
+    def get_hr_and_spo2(self):
+        """
+        Heart rate and SpO2 over the current window.
+
+        Returns:
+            tuple: (hr, hr_valid, spo2, spo2_valid), like hrcalc.calc_hr_and_spo2
+        """
+        window_start = self.sample_count - len(self.ir_data)
+        beats = self.beats_between(window_start)
+        hr, hr_valid = hrcalc._hr_from_peaks(beats, self.sample_freq)
+
+        spo2, spo2_valid = -999, False
+        if len(beats) >= 2:
+            peaks = np.rint(beats - window_start).astype(np.intp)
+            ratios = hrcalc._segment_ratios(self.ir_data.view(), self.red_data.view(), peaks)
+            if len(ratios) > 0:
+                spo2, spo2_valid = hrcalc._ratio_to_spo2(np.mean(ratios))
+
+        return hr, hr_valid, spo2, spo2_valid
+
+    def get_hrv(self, start, stop=None):
+        """
+        HRV metrics for the beats in the sample range [start, stop).
+
+        Requires at least MIN_HRV_TIME seconds of samples in the range.
+
+        Returns:
+            dict: Same keys as hrcalc.calc_hrv_metrics
+        """
+        stop = self.sample_count if stop is None else min(stop, self.sample_count)
+        if stop - start < hrcalc.window_samples(hrcalc.MIN_HRV_TIME, self.sample_freq):
+            return hrcalc.calc_hrv_metrics([], self.sample_freq)
+        return hrcalc.calc_hrv_metrics(self.beats_between(start, stop), self.sample_freq)
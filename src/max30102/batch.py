@@ -0,0 +1,148 @@
+"""
+Offline processing of recorded PPG data across all CPU cores.
+
+Each recording is run through hrcalc.calc_batch in a worker process and the
+results are streamed to a JSON Lines file (one line per recording) as soon
+as each worker finishes.
+
+Usage:
+    python -m max30102.batch recordings/*.csv -o results.jsonl -j 4
+"""
+
+from __future__ import print_function
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from . import hrcalc
+from .max30102 import decode_samples
+from .replay import load_recording as load_bus_recording, fifo_stream
+
+
+def load_recording(path):
+    """
+    Load a PPG recording.
+
+    Supported formats:
+        .npz: arrays named 'ir' and 'red'
+        .csv: two columns 'red,ir' (same order as MAX30102.read_fifo),
+              an optional header line is skipped
+        .maxr: raw bus recording written by replay.RecordingBus
+
+    Returns:
+        tuple: (ir, red) arrays
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npz':
+        with np.load(path) as data:
+            return data['ir'], data['red']
+    if ext == '.maxr':
+        samples, _ = fifo_stream(load_bus_recording(path))
+        red, ir = decode_samples(samples.tobytes())
+        return ir, red
+    if ext == '.csv':
+        data = np.genfromtxt(path, delimiter=',', dtype=np.float64)
+        data = data[~np.isnan(data).any(axis=1)]
+        return data[:, 1], data[:, 0]
+    raise ValueError("unsupported recording format: {0}".format(path))
+
+
+def process_recording(path, sample_freq=hrcalc.SAMPLE_FREQ, extended=False):
+    """
+    Load one recording and compute its HR/SpO2/HRV time series.
+
+    With `extended` the HRV series include the calc_hrv_extended metrics.
+
+    Returns:
+        dict: 'path', 'samples', 'elapsed' (processing time in seconds) and
+            the calc_batch results converted to lists
+    """
+    start = time.perf_counter()
+    ir, red = load_recording(path)
+    results = hrcalc.calc_batch(ir, red, sample_freq, extended=extended)
+
+    record = {'path': path, 'samples': len(ir)}
+    for key, value in results.items():
+        record[key] = value.tolist()
+    record['elapsed'] = time.perf_counter() - start
+    return record
+
+
+def process_files(paths, output, workers=None, sample_freq=hrcalc.SAMPLE_FREQ,
+                  extended=False):
+    """
+    Process recordings in a process pool, streaming results to `output`.
+
+    Args:
+        paths: Recording file paths
+        output: Writable text file, receives one JSON object per line
+        workers: Number of worker processes (default: one per CPU)
+        sample_freq: Sampling frequency of the recordings in Hz
+        extended: Add SDNN, SDSD, triangular index and LF/HF to the HRV series
+
+    Returns:
+        dict: Throughput summary with 'files', 'failed', 'samples',
+            'elapsed' and 'samples_per_sec'
+    """
+    start = time.perf_counter()
+    total_samples = 0
+    failed = 0
+    task = functools.partial(process_recording, sample_freq=sample_freq, extended=extended)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(task, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+                total_samples += record['samples']
+            except Exception as e:
+                record = {'path': futures[future], 'error': str(e)}
+                failed += 1
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'files': len(futures),
+        'failed': failed,
+        'samples': total_samples,
+        'elapsed': elapsed,
+        'samples_per_sec': total_samples / elapsed if elapsed > 0 else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute HR, SpO2 and HRV for recorded PPG files")
+    parser.add_argument("paths", nargs="+", help="recording files (.csv, .npz or .maxr)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="JSON Lines output file, default stdout")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of worker processes, default one per CPU")
+    parser.add_argument("-f", "--sample-freq", type=float, default=hrcalc.SAMPLE_FREQ,
+                        help="sampling frequency in Hz, default {0}".format(hrcalc.SAMPLE_FREQ))
+    parser.add_argument("-x", "--extended", action="store_true",
+                        help="add SDNN, SDSD, triangular index and LF/HF to the HRV series")
+    args = parser.parse_args(argv)
+
+    if args.output == "-":
+        summary = process_files(args.paths, sys.stdout, args.workers, args.sample_freq,
+                                args.extended)
+    else:
+        with open(args.output, "w") as output:
+            summary = process_files(args.paths, output, args.workers, args.sample_freq,
+                                    args.extended)
+
+    print("{files} files ({failed} failed), {samples} samples in {elapsed:.2f}s "
+          "= {samples_per_sec:.0f} samples/s".format(**summary), file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Typed MAX30102 acquisition settings.
+
+SensorConfig is the single source of the sensor timing: MAX30102.setup()
+turns it into register values and HeartRateMonitor / hrcalc take the
+effective sample rate (`sample_freq`) from it.
+"""
+
+from dataclasses import dataclass
+
+from .hrcalc import FILTER_BAND
+
+# Register field encodings (datasheet tables 3-5)
+SAMPLE_AVERAGES = {1: 0, 2: 1, 4: 2, 8: 3, 16: 4, 32: 5}
+SAMPLE_RATES = {50: 0, 100: 1, 200: 2, 400: 3, 800: 4, 1000: 5, 1600: 6, 3200: 7}
+PULSE_WIDTHS = {69: 0, 118: 1, 215: 2, 411: 3}      # us, 15-18 bit ADC resolution
+ADC_RANGES = {2048: 0, 4096: 1, 8192: 2, 16384: 3}  # nA full scale
+
+LED_CURRENT_STEP = 0.2  # mA per LED_PA LSB
+LED_CURRENT_MAX = 51.0  # mA
+
+
+@dataclass(frozen=True)
+class SensorConfig(object):
+    """
+    MAX30102 acquisition settings.
+
+    The defaults match the values the driver has always written: 100 Hz with
+    4-sample averaging (25 Hz effective), 411 us pulses, 4096 nA ADC range and
+    ~7 mA LED current. Not every sample rate / pulse width pair is supported
+    by the sensor in SpO2 mode, see the datasheet.
+
+    Attributes:
+        sample_rate: ADC sample rate in Hz
+        sample_average: Samples averaged into each FIFO entry, sample_rate /
+            sample_average must stay above twice the upper bandpass edge
+        pulse_width: LED pulse width in us
+        adc_range: ADC full scale in nA
+        led_current: Red and IR LED current in mA
+        pilot_current: Pilot LED current in mA
+        fifo_almost_full: FIFO entries that raise the A_FULL interrupt (17-32)
+    """
+
+    sample_rate: int = 100
+    sample_average: int = 4
+    pulse_width: int = 411
+    adc_range: int = 4096
+    led_current: float = 7.2
+    pilot_current: float = 25.4
+    fifo_almost_full: int = 17
+
+    def __post_init__(self):
+        if self.sample_rate not in SAMPLE_RATES:
+            raise ValueError("unsupported sample rate: {0}".format(self.sample_rate))
+        if self.sample_average not in SAMPLE_AVERAGES:
+            raise ValueError("unsupported sample average: {0}".format(self.sample_average))
+        if self.pulse_width not in PULSE_WIDTHS:
+            raise ValueError("unsupported pulse width: {0}".format(self.pulse_width))
+        if self.adc_range not in ADC_RANGES:
+            raise ValueError("unsupported ADC range: {0}".format(self.adc_range))
+        for current in (self.led_current, self.pilot_current):
+            if not 0 <= current <= LED_CURRENT_MAX:
+                raise ValueError("LED current out of range: {0} mA".format(current))
+        if not 17 <= self.fifo_almost_full <= 32:
+            raise ValueError("FIFO almost full must be 17-32: {0}".format(self.fifo_almost_full))
+        if self.sample_freq <= 2 * FILTER_BAND[1]:
+            # the bandpass upper edge must stay below Nyquist
+            raise ValueError(
+                "effective sample rate {0} Hz ({1} Hz / {2}) must be above {3} Hz".format(
+                    self.sample_freq, self.sample_rate, self.sample_average, 2 * FILTER_BAND[1]))
+
+    @property
+    def sample_freq(self):
+        """Effective rate of samples arriving in the FIFO, in Hz."""
+        return self.sample_rate / self.sample_average
+
+    @property
+    def fifo_config(self):
+        """REG_FIFO_CONFIG value: SMP_AVE[7:5], rollover off, FIFO_A_FULL[3:0]."""
+        return SAMPLE_AVERAGES[self.sample_average] << 5 | (32 - self.fifo_almost_full)
+
+    @property
+    def spo2_config(self):
+        """REG_SPO2_CONFIG value: ADC_RGE[6:5], SR[4:2], LED_PW[1:0]."""
+        return (ADC_RANGES[self.adc_range] << 5 |
+                SAMPLE_RATES[self.sample_rate] << 2 |
+                PULSE_WIDTHS[self.pulse_width])
+
+    @property
+    def led_pa(self):
+        """REG_LED1_PA / REG_LED2_PA value."""
+        return int(round(self.led_current / LED_CURRENT_STEP))
+
+    @property
+    def pilot_pa(self):
+        """REG_PILOT_PA value."""
+        return int(round(self.pilot_current / LED_CURRENT_STEP))
@@ -1,6 +1,12 @@
 
 from max30102 import MAX30102
+from .max30102 import OVF_COUNTER_MAX
+from .config import SensorConfig
 from . import hrcalc
+from .analyzer import PulseAnalyzer
+from .ringbuffer import RingBuffer
+from .stats import MonitorStats
+from dataclasses import dataclass
 import threading
 import time
 import numpy as np
@@ -11,10 +17,55 @@ HRV_IDLE = 'idle'
 HRV_COLLECTING = 'collecting'
 HRV_READY = 'ready'
 
+# HRV buffer overflow policies
+HRV_OVERFLOW_STOP = 'stop'        # use the first HRV_DURATION of beats
+HRV_OVERFLOW_ROLL = 'roll'        # use the latest HRV_DURATION of beats
+HRV_OVERFLOW_COMPUTE = 'compute'  # calculate HRV as soon as HRV_DURATION is collected
+
+# FIFO overflow policies
+FIFO_OVERFLOW_FILL = 'fill'              # pad dropped samples with the last value
+FIFO_OVERFLOW_INVALIDATE = 'invalidate'  # discard the window, readings and any HRV collection
+
 # Configuration
 HRV_DURATION = 60
+HRV_OVERFLOW = HRV_OVERFLOW_COMPUTE
 HRV_MIN_STABLE_TIME = 2
 FINGER_DETECTION_THRESHOLD = 50000
+BPM_AVERAGE_COUNT = 4
+FIFO_OVERFLOW = FIFO_OVERFLOW_INVALIDATE
+
+
+@dataclass(frozen=True)
+class MonitorSnapshot(object):
+    """
+    Consistent copy of the monitor results at one point in time.
+
+    Snapshots are immutable and never change after they are published, so
+    they can be read from any thread without locking.
+
+    Attributes:
+        seq: Increases by one with every published snapshot
+        timestamp: time.time() when the snapshot was taken
+        bpm: Averaged heart rate, 0 without a finger
+        spo: SpO2 in percent, 0 when invalid
+        hrv_state: HRV_IDLE, HRV_COLLECTING or HRV_READY
+        hrv_results: Copy of the HRV results dict or None
+        hrv_progress: (elapsed, duration, percentage), see get_hrv_progress()
+        live_hrv: HRV metrics so far while collecting, see get_live_hrv()
+        waveform: Read-only copy of the raw IR window
+        dropped_samples: Samples lost to FIFO overflows so far
+    """
+
+    seq: int
+    timestamp: float
+    bpm: float
+    spo: float
+    hrv_state: str
+    hrv_results: dict
+    hrv_progress: tuple
+    live_hrv: dict
+    waveform: np.ndarray
+    dropped_samples: int
 
 
 class HeartRateMonitor(object):
@@ -23,74 +74,283 @@ class HeartRateMonitor(object):
     """
 
     LOOP_TIME = 0.01
+    # upper bound on a single INT wait, so a missed edge or stop request
+    # never stalls the thread for long
+    INTERRUPT_TIMEOUT = 0.5
+
+    def __init__(self, interrupt_pin=None, hrv_overflow=HRV_OVERFLOW, bus=None,
+                 collect_stats=False, fifo_overflow=FIFO_OVERFLOW, config=None):
+        """
+        Args:
+            interrupt_pin: Optional InterruptPin wired to the sensor INT line.
+                When given, the thread sleeps until the sensor signals new
+                data instead of polling the FIFO every LOOP_TIME seconds.
+            hrv_overflow: What to do once HRV_DURATION of samples has been
+                collected but the collection is still running, one of
+                HRV_OVERFLOW_STOP, HRV_OVERFLOW_ROLL or HRV_OVERFLOW_COMPUTE
+            bus: Optional SMBus-compatible object passed to MAX30102, e.g. a
+                RecordingBus to capture a session or a ReplayBus to run
+                without hardware
+            collect_stats: Time each stage of the sensor loop, see get_stats()
+            fifo_overflow: What to do when the sensor drops samples because
+                the FIFO was full, FIFO_OVERFLOW_FILL keeps the time base by
+                padding the gap, FIFO_OVERFLOW_INVALIDATE restarts the window
+                and reports no BPM or SpO2 until it is full again
+            config: SensorConfig for the sensor, all timing (window sizes,
+                HRV length, peak spacing) follows its sample_freq
+        """
+        if hrv_overflow not in (HRV_OVERFLOW_STOP, HRV_OVERFLOW_ROLL, HRV_OVERFLOW_COMPUTE):
+            raise ValueError("unknown HRV overflow policy: {0}".format(hrv_overflow))
+        if fifo_overflow not in (FIFO_OVERFLOW_FILL, FIFO_OVERFLOW_INVALIDATE):
+            raise ValueError("unknown FIFO overflow policy: {0}".format(fifo_overflow))
+        self.interrupt_pin = interrupt_pin
+        self.bus = bus
+        self.config = config if config is not None else SensorConfig()
+        self.sample_freq = self.config.sample_freq
+        self.hrv_overflow = hrv_overflow
+        self.fifo_overflow = fifo_overflow
+        self._stats = MonitorStats() if collect_stats else None
+        self._last_drain = None
+
+        # Dropped sample tracking
+        self.dropped_samples = 0
+        self.last_batch_time = None
 
-    def __init__(self):
         self.bpm = 0
         self.spo = 0
         
         # HRV state machine
         self.hrv_state = HRV_IDLE
-        self.hrv_buffer_ir = []
+        self.hrv_samples = hrcalc.window_samples(HRV_DURATION, self.sample_freq)
         self.hrv_start_time = None
+        self.hrv_start_sample = None
         self.hrv_results = None
-        
-        self.ir_data = []
-        self.red_data = []
+        # updated per beat while collecting, see get_live_hrv()
+        self.live_hrv = hrcalc.RunningHRV(
+            self.sample_freq,
+            window=HRV_DURATION if hrv_overflow == HRV_OVERFLOW_ROLL else None)
+
+        # filters and detects beats once per batch for HR, SpO2 and HRV
+        self.analyzer = PulseAnalyzer(self.sample_freq, history=2 * HRV_DURATION)
+        self.ir_data = self.analyzer.ir_data
+        self.red_data = self.analyzer.red_data
+        self._bpms = RingBuffer(BPM_AVERAGE_COUNT)
         
         # Stability tracking
         self._stable_start_time = None
         self._last_bpm = 0
 
+        # held by whoever changes the results, so a snapshot is never taken
+        # halfway through an update
+        self._state_lock = threading.Lock()
+        # results published for other threads, see get_snapshot()
+        self._snapshot_cond = threading.Condition()
+        self._snapshot = None
+        self._publish()
+
     def run_sensor(self):
-        sensor = MAX30102()
-        self.ir_data = []
-        self.red_data = []
-        bpms = []
+        sensor = MAX30102(bus=self.bus, config=self.config)
+        self.analyzer.reset()
+        self._bpms.clear()
 
         # run until told to stop
         while not self._thread.stopped:
-            # check if any data is available
-            num_bytes = sensor.get_data_present()
-            if num_bytes > 0:
-                # grab all the data and stash it into arrays
-                while num_bytes > 0:
-                    red, ir = sensor.read_fifo()
-                    
-                    self.latest_ir_value = ir
-                    
-                    num_bytes -= 1
-                    self.ir_data.append(ir)
-                    self.red_data.append(red)
-
-                    # HRV data into separate buffer
-                    if self.hrv_state == HRV_COLLECTING:
-                        self.hrv_buffer_ir.append(ir)
-
-                while len(self.ir_data) > 100:
-                    self.ir_data.pop(0)
-                    self.red_data.pop(0)
-
-                if len(self.ir_data) == 100:
-                    bpm, valid_bpm, spo2, valid_spo2 = hrcalc.calc_hr_and_spo2(self.ir_data, self.red_data)
-                    if(valid_spo2):
-                        self.spo = spo2
-                    else:
-                        self.spo = 0
-                    if valid_bpm:
-                        bpms.append(bpm)
-                        while len(bpms) > 4:
-                            bpms.pop(0)
-                        self.bpm = np.mean(bpms)
-                        if (np.mean(self.ir_data) < FINGER_DETECTION_THRESHOLD and np.mean(self.red_data) < FINGER_DETECTION_THRESHOLD):
-                            self.bpm = 0
+            self._drain(sensor)
+
+            if self.interrupt_pin is not None:
+                # drain again on timeout as well, in case an edge was missed
+                self.interrupt_pin.wait(self.INTERRUPT_TIMEOUT)
+            else:
+                time.sleep(self.LOOP_TIME)
+
+        sensor.shutdown()
+
+    def _drain(self, sensor):
+        """
+        Read everything waiting in the sensor FIFO and update the results.
 
+        Returns:
+            int: Number of samples read
+        """
+        stats = self._stats
+        if stats is not None:
+            t_start = time.perf_counter()
+            self._record_loop_jitter(stats, t_start)
+
+        # grab all the data in one burst and stash it into arrays
+        red, ir, overflow, timestamp = sensor.drain_fifo()
+        num_samples = len(ir)
+        if num_samples > 0:
+            if stats is not None:
+                t_read = time.perf_counter()
+                stats.bus_read.add((t_read - t_start) * 1e6)
+
+            if overflow >= OVF_COUNTER_MAX and self.last_batch_time is not None:
+                # the counter saturated, estimate the gap from the batch times
+                expected = hrcalc.window_samples(timestamp - self.last_batch_time, self.sample_freq)
+                overflow = max(overflow, expected - num_samples)
+            self.last_batch_time = timestamp
+            with self._state_lock:
+                self.latest_ir_value = int(ir[-1])
+
+                self._analyze(ir, red)
+
+                if overflow:
+                    self._handle_overflow(overflow)
+
+                if self.ir_data.full:
+                    ir_window = self.ir_data.view()
+                    red_window = self.red_data.view()
+                    if (np.mean(ir_window) < FINGER_DETECTION_THRESHOLD and np.mean(red_window) < FINGER_DETECTION_THRESHOLD):
+                        # finger removed, start over once it is back
+                        self.bpm = 0
+                        self.spo = 0
+                        self._bpms.clear()
+                        self.analyzer.reset()
+                    else:
+                        bpm, valid_bpm, spo2, valid_spo2 = self.analyzer.get_hr_and_spo2()
+                        if(valid_spo2):
+                            self.spo = spo2
+                        else:
+                            self.spo = 0
+                        if valid_bpm:
+                            self._bpms.append(bpm)
+                            self.bpm = np.mean(self._bpms.view())
 
                 # HRV state machine
                 self._update_hrv_state()
+                self._publish()
 
-            time.sleep(self.LOOP_TIME)
+            if stats is not None:
+                stats.dsp.add((time.perf_counter() - t_read) * 1e6)
 
-        sensor.shutdown()
+        if stats is not None:
+            stats.drains += 1
+            stats.samples += num_samples
+            stats.samples_per_drain.add(num_samples)
+            if num_samples == 0:
+                stats.empty_drains += 1
+            if overflow:
+                stats.overflow_events += 1
+                stats.overflow_samples += overflow
+
+        return num_samples
+
+    def _publish(self):
+        """
+        Swap in a new snapshot of the current results and wake waiters.
+
+        The caller must hold _state_lock.
+        """
+        with self._snapshot_cond:
+            waveform = self.ir_data.view().copy()
+            waveform.flags.writeable = False
+            results = self.hrv_results
+            self._snapshot = MonitorSnapshot(
+                seq=self._snapshot.seq + 1 if self._snapshot is not None else 0,
+                timestamp=time.time(),
+                bpm=self.bpm,
+                spo=self.spo,
+                hrv_state=self.hrv_state,
+                hrv_results=dict(results) if results is not None else None,
+                hrv_progress=self.get_hrv_progress(),
+                live_hrv=self.get_live_hrv(),
+                waveform=waveform,
+                dropped_samples=self.dropped_samples,
+            )
+            self._snapshot_cond.notify_all()
+
+    def get_snapshot(self):
+        """
+        Get the latest results, safe to call from any thread.
+
+        Returns:
+            MonitorSnapshot: Compare `seq` with a previous snapshot to see
+                whether anything changed
+        """
+        with self._snapshot_cond:
+            return self._snapshot
+
+    def wait_for_update(self, seq, timeout=None):
+        """
+        Wait until a snapshot newer than `seq` is published.
+
+        Args:
+            seq: Sequence number of the last snapshot seen, None to return
+                the current one right away
+            timeout: Maximum seconds to wait, None to wait forever
+
+        Returns:
+            MonitorSnapshot: The latest snapshot, still the one numbered
+                `seq` if the timeout expired
+        """
+        with self._snapshot_cond:
+            self._snapshot_cond.wait_for(lambda: self._snapshot.seq != seq, timeout)
+            return self._snapshot
+
+    def _analyze(self, ir, red):
+        """Feed samples to the analyzer and new HRV beats to live_hrv."""
+        beats = self.analyzer.update(ir, red)
+        if self.hrv_state == HRV_COLLECTING and len(beats):
+            start = self.hrv_start_sample
+            if self.hrv_overflow == HRV_OVERFLOW_ROLL:
+                self.live_hrv.update(beats[beats >= start])
+            else:
+                self.live_hrv.update(beats[(beats >= start) & (beats < start + self.hrv_samples)])
+
+    def _handle_overflow(self, overflow):
+        """
+        Account for samples the sensor dropped after the batch just read.
+
+        Args:
+            overflow: Number of dropped samples
+        """
+        self.dropped_samples += overflow
+
+        if self.fifo_overflow == FIFO_OVERFLOW_FILL:
+            # hold the last value so peak intervals keep the right time base
+            self._analyze(np.full(overflow, self.ir_data.view()[-1]),
+                          np.full(overflow, self.red_data.view()[-1]))
+        else:
+            # the window has a hole in it, wait for a complete one and do not
+            # show or average in readings from before the gap
+            self.analyzer.reset()
+            self._bpms.clear()
+            self.bpm = 0
+            self.spo = 0
+            if self.hrv_state == HRV_COLLECTING:
+                self.hrv_state = HRV_IDLE
+                self._stable_start_time = None
+
+    def _record_loop_jitter(self, stats, now):
+        """Record how far the time since the last drain is off its nominal period."""
+        if self._last_drain is not None:
+            if self.interrupt_pin is not None:
+                # PPG_RDY fires once per sample
+                nominal = 1.0 / self.sample_freq
+            else:
+                nominal = self.LOOP_TIME
+            stats.loop_jitter.add(abs(now - self._last_drain - nominal) * 1e6)
+        self._last_drain = now
+
+    def get_stats(self):
+        """
+        Get sensor loop statistics.
+
+        Returns:
+            dict: Counters (drains, samples, FIFO overflows) and histograms
+                (bus_read, samples_per_drain, dsp, loop_jitter), or None if
+                the monitor was created without collect_stats
+        """
+        if self._stats is None:
+            return None
+        return self._stats.to_dict()
+
+    def reset_stats(self):
+        """Clear collected statistics."""
+        if self._stats is not None:
+            self._stats.reset()
+            self._last_drain = None
 
     def _update_hrv_state(self):
         """Update HRV state machine based on current conditions."""
@@ -108,8 +368,9 @@ class HeartRateMonitor(object):
                         if stable_duration >= HRV_MIN_STABLE_TIME:
                             # Start HRV collection
                             self.hrv_state = HRV_COLLECTING
-                            self.hrv_buffer_ir = []
                             self.hrv_start_time = time.time()
+                            self.hrv_start_sample = self.analyzer.sample_count
+                            self.live_hrv.reset()
                     else:
                         self._stable_start_time = time.time()
                         self._last_bpm = self.bpm
@@ -119,19 +380,24 @@ class HeartRateMonitor(object):
         elif self.hrv_state == HRV_COLLECTING:
             if not finger_detected:
                 self.hrv_state = HRV_IDLE
-                self.hrv_buffer_ir = []
                 self._stable_start_time = None
             else:
                 elapsed = time.time() - self.hrv_start_time
-                if elapsed >= HRV_DURATION:
+                collected = self.analyzer.sample_count - self.hrv_start_sample
+                buffer_full = (self.hrv_overflow == HRV_OVERFLOW_COMPUTE and
+                               collected >= self.hrv_samples)
+                if elapsed >= HRV_DURATION or buffer_full:
                     self._calculate_hrv()
                     
         elif self.hrv_state == HRV_READY:
             pass  # Wait for acknowledge_hrv()
 
     def _calculate_hrv(self):
-        """Calculate HRV from collected buffer."""
-        self.hrv_results = hrcalc.calc_hrv_from_buffer(self.hrv_buffer_ir)
+        """Calculate HRV from the beats detected during collection."""
+        start = self.hrv_start_sample
+        if self.hrv_overflow == HRV_OVERFLOW_ROLL:
+            start = max(start, self.analyzer.sample_count - self.hrv_samples)
+        self.hrv_results = self.analyzer.get_hrv(start, start + self.hrv_samples)
         
         if self.hrv_results and self.hrv_results['valid']:
             self.hrv_state = HRV_READY
@@ -141,10 +407,22 @@ class HeartRateMonitor(object):
 
     def acknowledge_hrv(self):
         """Acknowledge HRV results and reset to idle state."""
-        self.hrv_state = HRV_IDLE
-        self.hrv_results = None
-        self.hrv_buffer_ir = []
-        self._stable_start_time = None
+        with self._state_lock:
+            self.hrv_state = HRV_IDLE
+            self.hrv_results = None
+            self._stable_start_time = None
+            self._publish()
+
+    def get_live_hrv(self):
+        """
+        Get HRV metrics of the beats collected so far.
+
+        Returns:
+            dict: Same keys as hrv_results, or None when not collecting
+        """
+        if self.hrv_state != HRV_COLLECTING:
+            return None
+        return self.live_hrv.get_metrics()
 
     def get_hrv_progress(self):
         """Get HRV collection progress."""
@@ -162,5 +440,7 @@ class HeartRateMonitor(object):
 
     def stop_sensor(self, timeout=2.0):
         self._thread.stopped = True
-        self.bpm = 0
-        self._thread.join(timeout)
\ No newline at end of file
+        self._thread.join(timeout)
+        with self._state_lock:
+            self.bpm = 0
+            self._publish()
\ No newline at end of file
@@ -5,127 +5,276 @@ Provides signal processing and calculation functions for heart rate,
 blood oxygen saturation (SpO2), and heart rate variability (HRV) metrics.
 """
 
+import functools
+from collections import deque
+
 import numpy as np
 import scipy.signal
 
-SAMPLE_FREQ = 25    # Samples per second
-BUFFER_SIZE = 100   # Sampling frequency * 4
+SAMPLE_FREQ = 25    # Default samples per second, see SensorConfig.sample_freq
+
+# Window lengths in seconds, converted to samples for the actual sample rate
+WINDOW_TIME = 4         # HR/SpO2 window
+HRV_WINDOW_TIME = 60    # Rolling HRV window
+HRV_STEP_TIME = 10      # Rolling HRV step
+MIN_HRV_TIME = 30       # Minimum data for an HRV calculation
+
+# Heartbeat bandpass filter (0.5Hz - 4Hz = 30-240 BPM)
+FILTER_ORDER = 2
+FILTER_BAND = (0.5, 4)
+
+# Peak detection
+MIN_BEAT_INTERVAL = 0.4       # Minimum seconds between beats (150 BPM)
+PEAK_PROMINENCE_RATIO = 0.1   # Prominence as a fraction of the signal range
+MIN_PROMINENCE = 10           # Minimum prominence to avoid detecting noise
+# A beat closer than this fraction of the last RR interval and lower than
+# this fraction of the last beat is its dicrotic wave, not a new beat
+DICROTIC_INTERVAL_RATIO = 0.6
+DICROTIC_HEIGHT_RATIO = 0.5
+
+# Extended HRV
+TACHOGRAM_FREQ = 4            # Hz, even resampling of the RR series for Welch
+LF_BAND = (0.04, 0.15)        # Hz
+HF_BAND = (0.15, 0.4)         # Hz
+MIN_SPECTRAL_TIME = 50        # Minimum RR series length for LF/HF, 2 cycles at 0.04 Hz
+TRIANGULAR_BIN = 1000 / 128.  # ms, standard 1/128 s histogram bin
+
+
+def window_samples(duration, sample_freq=SAMPLE_FREQ):
+    """Number of samples covering `duration` seconds at `sample_freq`."""
+    return int(round(duration * sample_freq))
+
+
+def _peak_distance(sample_freq):
+    """Minimum distance between beats in samples."""
+    return max(1, window_samples(MIN_BEAT_INTERVAL, sample_freq))
+
+
+@functools.lru_cache(maxsize=32)
+def _design_bandpass(order, low, high, sample_freq):
+    sos = scipy.signal.butter(order, [low, high], 'bandpass', fs=sample_freq, output='sos')
+    zi = scipy.signal.sosfilt_zi(sos)
+    return sos, zi
+
+
+def get_bandpass(sample_freq=SAMPLE_FREQ, band=FILTER_BAND, order=FILTER_ORDER):
+    """
+    Get cached Butterworth bandpass coefficients.
+
+    The design is computed once per (order, band, sample_freq) and shared by
+    all filtering functions in this module.
+
+    Args:
+        sample_freq: Sampling frequency in Hz
+        band: (low, high) cutoff frequencies in Hz
+        order: Filter order
+
+    Returns:
+        tuple: (sos, zi) second-order sections and the matching sosfilt_zi
+            step-response initial conditions. Both arrays are shared, so
+            callers must not modify them in place.
+    """
+    low, high = band
+    return _design_bandpass(int(order), float(low), float(high), float(sample_freq))
+
 
+def filter_cache_info():
+    """Return hit/miss statistics of the bandpass design cache."""
+    return _design_bandpass.cache_info()
 
-def _filter_and_find_peaks(ir_data, sample_freq=SAMPLE_FREQ):
+
+def clear_filter_cache():
+    """Drop all cached bandpass designs."""
+    _design_bandpass.cache_clear()
+
+
+def _refine_peaks(signal, peaks):
+    """
+    Refine peak positions to sub-sample precision.
+
+    Fits a parabola through each peak and its two neighbours and moves the
+    peak to the vertex. Peaks on the first or last sample are left as is.
+
+    Args:
+        signal: Array the peaks were detected in
+        peaks: Integer peak indices
+
+    Returns:
+        ndarray: Fractional peak positions (float64)
+    """
+    peaks = np.asarray(peaks, dtype=np.intp)
+    positions = peaks.astype(np.float64)
+
+    inner = (peaks > 0) & (peaks < len(signal) - 1)
+    p = peaks[inner]
+    left = signal[p - 1]
+    center = signal[p]
+    right = signal[p + 1]
+
+    denom = left - 2 * center + right
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offset = np.where(denom != 0, 0.5 * (left - right) / denom, 0.0)
+    positions[inner] += np.clip(offset, -0.5, 0.5)
+    return positions
+
+
+def _filter_and_find_peaks(ir_data, sample_freq=SAMPLE_FREQ, refine=False):
     """
     Apply bandpass filter and detect peaks in IR data.
     
     Args:
         ir_data: Array of infrared LED readings
         sample_freq: Sampling frequency in Hz
+        refine: Return fractional (parabolic interpolated) peak positions
+            instead of sample indices
     
     Returns:
         tuple: (peaks, ir_filtered)
     """
-    ir_data = np.array(ir_data)
+    ir_data = np.asarray(ir_data)
     
     # Bandpass filter (0.5Hz - 4Hz) to isolate heartbeat signal
-    sos = scipy.signal.butter(2, [0.5, 4], 'bandpass', fs=sample_freq, output='sos')
+    sos, _ = get_bandpass(sample_freq)
     ir_filtered = scipy.signal.sosfiltfilt(sos, ir_data)
     
     # Dynamic prominence: 10% of signal range
     signal_range = np.max(ir_filtered) - np.min(ir_filtered)
-    prominence = max(signal_range * 0.1, 10)  # Minimum 10 to avoid noise
+    prominence = max(signal_range * PEAK_PROMINENCE_RATIO, MIN_PROMINENCE)
     
-    peaks, _ = scipy.signal.find_peaks(ir_filtered, distance=10, prominence=prominence)
+    peaks, _ = scipy.signal.find_peaks(
+        ir_filtered, distance=_peak_distance(sample_freq), prominence=prominence)
+
+    if refine:
+        peaks = _refine_peaks(ir_filtered, peaks)
     
     return peaks, ir_filtered
 
 
-def calc_hr_and_spo2(ir_data, red_data):
+def _segment_ratios(ir_data, red_data, peaks):
     """
-    Calculate heart rate and SpO2 from PPG signals.
+    Calculate the SpO2 ratio for every peak-to-peak segment in one pass.
+
+    Each segment [peaks[i], peaks[i + 1]) longer than 2 samples yields
+    R = (AC_red / DC_red) / (AC_ir / DC_ir), where AC is max - min and DC is
+    the mean of the segment. Segments with a zero DC or IR AC are skipped.
 
     Args:
         ir_data: Array of infrared LED readings
         red_data: Array of red LED readings
+        peaks: Sorted array of peak indices
 
     Returns:
-        tuple: (hr, hr_valid, spo2, spo2_valid, hrv_metrics)
+        ndarray: Ratios of the valid segments, in segment order
     """
-    ir_data = np.array(ir_data)
-    red_data = np.array(red_data)
+    peaks = np.asarray(peaks, dtype=np.intp)
+    if len(peaks) < 2:
+        return np.empty(0)
 
-    peaks, _ = _filter_and_find_peaks(ir_data)
+    lengths = np.diff(peaks)
+    starts = peaks[:-1]
+    keep = lengths > 2
+    if not np.any(keep):
+        return np.empty(0)
 
-    # Calculate BPM
-    if len(peaks) >= 2:
-        # Calculate intervals between peaks in seconds
-        intervals = np.diff(peaks) / SAMPLE_FREQ
+    # reduceat over [peaks[0], peaks[-1]) gives exactly one result per segment
+    first, last = peaks[0], peaks[-1]
+    offsets = starts - first
+    ir = np.asarray(ir_data, dtype=np.float64)[first:last]
+    red = np.asarray(red_data, dtype=np.float64)[first:last]
 
-        # Use median interval for stability
-        median_interval = np.median(intervals)
+    ir_ac = np.maximum.reduceat(ir, offsets) - np.minimum.reduceat(ir, offsets)
+    red_ac = np.maximum.reduceat(red, offsets) - np.minimum.reduceat(red, offsets)
+    ir_dc = np.add.reduceat(ir, offsets) / lengths
+    red_dc = np.add.reduceat(red, offsets) / lengths
 
-        if median_interval > 0:
-            hr = int(60 / median_interval)
-            hr_valid = True
-        else:
-            hr = -999
-            hr_valid = False
-    else:
-        hr = -999
-        hr_valid = False
+    keep &= (ir_dc != 0) & (red_dc != 0) & (ir_ac != 0)
+    ir_ac, ir_dc = ir_ac[keep], ir_dc[keep]
+    red_ac, red_dc = red_ac[keep], red_dc[keep]
 
-    # Calculate SpO2
-    spo2 = -999
-    spo2_valid = False
-    hrv_metrics = {}
+    # Calculate ratio: R = (AC_red/DC_red) / (AC_ir/DC_ir)
+    return (red_ac / red_dc) / (ir_ac / ir_dc)
 
-    if len(peaks) >= 2:
-        ratios = []
 
-        for i in range(len(peaks) - 1):
-            start_idx = peaks[i]
-            end_idx = peaks[i + 1]
+def _ratio_to_spo2(ratio_avg):
+    """
+    Convert an average SpO2 ratio to a saturation percentage.
 
-            if end_idx - start_idx > 2:
-                ir_segment = ir_data[start_idx:end_idx]
-                red_segment = red_data[start_idx:end_idx]
+    Returns:
+        tuple: (spo2, spo2_valid)
+    """
+    # Scale ratio and apply calibration curve
+    ratio_avg_scaled = ratio_avg * 100
 
-                # Calculate AC and DC components
-                ir_min = np.min(ir_segment)
-                ir_max = np.max(ir_segment)
-                red_min = np.min(red_segment)
-                red_max = np.max(red_segment)
+    if 2 < ratio_avg_scaled < 184:
+        # Quadratic calibration formula
+        spo2 = (-45.060 * (ratio_avg_scaled ** 2) / 10000.0 +
+                30.054 * ratio_avg_scaled / 100.0 + 94.845)
+        return spo2, True
 
-                ir_ac = ir_max - ir_min
-                ir_dc = np.mean(ir_segment)
-                red_ac = red_max - red_min
-                red_dc = np.mean(red_segment)
+    return -999, False
 
-                # Calculate ratio: R = (AC_red/DC_red) / (AC_ir/DC_ir)
-                if ir_dc != 0 and red_dc != 0 and ir_ac != 0:
-                    r = (red_ac / red_dc) / (ir_ac / ir_dc)
-                    ratios.append(r)
 
-        if len(ratios) > 0:
-            ratio_avg = np.mean(ratios)
+def _hr_from_peaks(peaks, sample_freq=SAMPLE_FREQ):
+    """
+    Calculate heart rate from the median peak-to-peak interval.
+
+    Returns:
+        tuple: (hr, hr_valid)
+    """
+    if len(peaks) < 2:
+        return -999, False
+
+    # Calculate intervals between peaks in seconds
+    intervals = np.diff(peaks) / sample_freq
+
+    # Use median interval for stability
+    median_interval = np.median(intervals)
+
+    if median_interval > 0:
+        return int(60 / median_interval), True
+    return -999, False
 
-            # Scale ratio and apply calibration curve
-            ratio_avg_scaled = ratio_avg * 100
 
-            if 2 < ratio_avg_scaled < 184:
-                # Quadratic calibration formula
-                spo2 = (-45.060 * (ratio_avg_scaled ** 2) / 10000.0 +
-                        30.054 * ratio_avg_scaled / 100.0 + 94.845)
-                spo2_valid = True
+def calc_hr_and_spo2(ir_data, red_data, sample_freq=SAMPLE_FREQ):
+    """
+    Calculate heart rate and SpO2 from PPG signals.
+
+    Args:
+        ir_data: Array (or RingBuffer) of infrared LED readings
+        red_data: Array (or RingBuffer) of red LED readings
+        sample_freq: Sampling frequency in Hz
 
+    Returns:
+        tuple: (hr, hr_valid, spo2, spo2_valid, hrv_metrics)
+    """
+    ir_data = np.asarray(ir_data)
+    red_data = np.asarray(red_data)
+
+    peaks, ir_filtered = _filter_and_find_peaks(ir_data, sample_freq)
+
+    # Calculate BPM from sub-sample peak positions
+    hr, hr_valid = _hr_from_peaks(_refine_peaks(ir_filtered, peaks), sample_freq)
+
+    # Calculate SpO2
+    spo2 = -999
+    spo2_valid = False
+    hrv_metrics = {}
+
+    if len(peaks) >= 2:
+        ratios = _segment_ratios(ir_data, red_data, peaks)
+
+        if len(ratios) > 0:
+            spo2, spo2_valid = _ratio_to_spo2(np.mean(ratios))
 
     return hr, hr_valid, spo2, spo2_valid
 
 
-def calc_hrv_metrics(peaks, sample_freq=25):
+def calc_hrv_metrics(peaks, sample_freq=SAMPLE_FREQ):
     """
     Calculate HRV metrics from detected peaks.
 
     Args:
-        peaks: Array of peak indices
+        peaks: Array of peak positions in samples (may be fractional)
         sample_freq: Sampling frequency in Hz
 
     Returns:
@@ -180,7 +329,148 @@ def calc_hrv_metrics(peaks, sample_freq=25):
     }
 
 
-def calc_hrv_from_buffer(ir_buffer, sample_freq=25):
+class Tachogram(object):
+    """
+    RR interval series of a beat sequence.
+
+    Outliers are removed as in calc_hrv_metrics. The evenly resampled series,
+    its Welch spectrum and the metric groups are computed on first use and
+    cached, so all metrics of a long recording share one pass over it.
+    """
+
+    def __init__(self, peaks, sample_freq=SAMPLE_FREQ, resample_freq=TACHOGRAM_FREQ):
+        """
+        Args:
+            peaks: Beat positions in samples (may be fractional)
+            sample_freq: Sampling frequency of the beat positions in Hz
+            resample_freq: Rate of the evenly resampled RR series in Hz
+        """
+        peaks = np.asarray(peaks, dtype=np.float64)
+        self.resample_freq = resample_freq
+
+        rr = np.diff(peaks) / sample_freq * 1000
+        valid = (rr >= 300) & (rr <= 2000)
+        self.rr = rr[valid]
+        # each interval is placed at the time of the beat that ends it
+        self.times = peaks[1:][valid] / sample_freq
+
+        self._resampled = None
+        self._spectrum = None
+        self._time_domain = None
+        self._frequency_domain = None
+
+    def __len__(self):
+        return len(self.rr)
+
+    @property
+    def duration(self):
+        """Seconds covered by the RR series."""
+        return self.times[-1] - self.times[0] if len(self.times) > 1 else 0.0
+
+    @property
+    def resampled(self):
+        """(times, rr) linearly interpolated at resample_freq."""
+        if self._resampled is None:
+            if len(self.rr) < 2:
+                self._resampled = (np.empty(0), np.empty(0))
+            else:
+                t = np.arange(self.times[0], self.times[-1], 1.0 / self.resample_freq)
+                self._resampled = (t, np.interp(t, self.times, self.rr))
+        return self._resampled
+
+    @property
+    def spectrum(self):
+        """(freqs, psd) Welch power spectrum of the resampled series in ms^2/Hz."""
+        if self._spectrum is None:
+            _, rr = self.resampled
+            if len(rr) < 2:
+                self._spectrum = (np.empty(0), np.empty(0))
+            else:
+                # 64 s segments resolve the lower edge of the LF band
+                nperseg = min(len(rr), int(64 * self.resample_freq))
+                self._spectrum = scipy.signal.welch(
+                    rr, fs=self.resample_freq, nperseg=nperseg, detrend='linear')
+        return self._spectrum
+
+    def band_power(self, band):
+        """Spectral power in the (low, high) band in ms^2."""
+        freqs, psd = self.spectrum
+        if len(freqs) < 2:
+            return 0.0
+        low, high = band
+        mask = (freqs >= low) & (freqs < high)
+        return float(np.sum(psd[mask]) * (freqs[1] - freqs[0]))
+
+    def time_domain(self):
+        """
+        Time-domain metrics.
+
+        Returns:
+            dict: 'sdnn', 'sdsd', 'triangular_index' (-999 if fewer than 3
+                intervals) and 'num_intervals'
+        """
+        if self._time_domain is None:
+            rr = self.rr
+            if len(rr) < 3:
+                self._time_domain = {
+                    'sdnn': -999,
+                    'sdsd': -999,
+                    'triangular_index': -999,
+                    'num_intervals': len(rr),
+                }
+            else:
+                bins = ((rr - rr.min()) / TRIANGULAR_BIN).astype(np.intp)
+                self._time_domain = {
+                    'sdnn': round(float(np.std(rr, ddof=1)), 2),
+                    'sdsd': round(float(np.std(np.diff(rr), ddof=1)), 2),
+                    'triangular_index': round(len(rr) / float(np.bincount(bins).max()), 2),
+                    'num_intervals': len(rr),
+                }
+        return self._time_domain
+
+    def frequency_domain(self):
+        """
+        Frequency-domain metrics.
+
+        Returns:
+            dict: 'lf' and 'hf' band powers in ms^2 and 'lf_hf' ratio, -999
+                if the series is shorter than MIN_SPECTRAL_TIME
+        """
+        if self._frequency_domain is None:
+            lf = hf = lf_hf = -999
+            if self.duration >= MIN_SPECTRAL_TIME:
+                lf = self.band_power(LF_BAND)
+                hf = self.band_power(HF_BAND)
+                lf_hf = round(lf / hf, 3) if hf > 0 else -999
+                lf = round(lf, 1)
+                hf = round(hf, 1)
+            self._frequency_domain = {'lf': lf, 'hf': hf, 'lf_hf': lf_hf}
+        return self._frequency_domain
+
+
+def calc_hrv_extended(peaks, sample_freq=SAMPLE_FREQ, tachogram=None):
+    """
+    Calculate the full HRV metric set from detected peaks.
+
+    Args:
+        peaks: Array of peak positions in samples (may be fractional)
+        sample_freq: Sampling frequency in Hz
+        tachogram: Optional Tachogram of the same peaks to reuse its cache
+
+    Returns:
+        dict: calc_hrv_metrics keys plus 'sdnn', 'sdsd', 'triangular_index',
+            'lf', 'hf' and 'lf_hf', invalid values are -999
+    """
+    if tachogram is None:
+        tachogram = Tachogram(peaks, sample_freq)
+
+    metrics = dict(tachogram.time_domain())
+    metrics.update(tachogram.frequency_domain())
+    metrics.update(calc_hrv_metrics(peaks, sample_freq))
+    return metrics
+
+
+def calc_hrv_from_buffer(ir_buffer, sample_freq=SAMPLE_FREQ):
     """
     Calculate HRV metrics from extended raw IR data buffer.
     
@@ -194,7 +484,7 @@ def calc_hrv_from_buffer(ir_buffer, sample_freq=25):
     Returns:
         dict: HRV metrics including RMSSD, pNN50, mean_hr, and validity
     """
-    if len(ir_buffer) < 750:  # Minimum ~30 seconds at 25Hz
+    if len(ir_buffer) < window_samples(MIN_HRV_TIME, sample_freq):  # Minimum ~30 seconds
         return {
             'rmssd': -999,
             'pnn50': -999,
@@ -203,7 +493,457 @@ def calc_hrv_from_buffer(ir_buffer, sample_freq=25):
             'valid': False
         }
     
-    peaks, _ = _filter_and_find_peaks(ir_buffer, sample_freq)
+    peaks, _ = _filter_and_find_peaks(ir_buffer, sample_freq, refine=True)
     
     # Use existing calc_hrv_metrics for the actual calculation
-    return calc_hrv_metrics(peaks, sample_freq)
\ No newline at end of file
+    return calc_hrv_metrics(peaks, sample_freq)
+
+
+def _window_thresholds(filtered, starts, window):
+    """Dynamic prominence threshold for each window of `filtered`."""
+    windows = np.lib.stride_tricks.sliding_window_view(filtered, window)[starts]
+    signal_range = windows.max(axis=1) - windows.min(axis=1)
+    return np.maximum(signal_range * PEAK_PROMINENCE_RATIO, MIN_PROMINENCE)
+
+
+def calc_batch(ir_data, red_data, sample_freq=SAMPLE_FREQ, window=None,
+               step=None, hrv_window=None, hrv_step=None, extended=False):
+    """
+    Calculate HR, SpO2 and rolling HRV time series over a long recording.
+
+    The whole recording is filtered once and peaks are detected once. Each
+    window then keeps the peaks whose prominence passes that window's dynamic
+    threshold (10% of its filtered range), mirroring calc_hr_and_spo2 and
+    calc_hrv_from_buffer without re-filtering every window. Results can
+    differ slightly from the single-window functions near window edges.
+
+    Args:
+        ir_data: Full-length array of infrared LED readings
+        red_data: Full-length array of red LED readings
+        sample_freq: Sampling frequency in Hz
+        window: HR/SpO2 window length in samples (default WINDOW_TIME)
+        step: Samples between consecutive HR/SpO2 windows (default 1s)
+        hrv_window: HRV window length in samples (default HRV_WINDOW_TIME)
+        hrv_step: Samples between consecutive HRV windows (default HRV_STEP_TIME)
+        extended: Add the calc_hrv_extended metrics to the HRV series
+
+    Returns:
+        dict: 'time', 'hr', 'hr_valid', 'spo2', 'spo2_valid' arrays with one
+            entry per HR/SpO2 window, and 'hrv_time', 'rmssd', 'pnn50',
+            'mean_hr', 'hrv_valid' (plus 'sdnn', 'sdsd', 'triangular_index',
+            'lf', 'hf', 'lf_hf' if extended) arrays with one entry per HRV
+            window. Times are window end times in seconds, invalid values
+            are -999.
+    """
+    window = window or window_samples(WINDOW_TIME, sample_freq)
+    step = step or window_samples(1, sample_freq)
+    hrv_window = hrv_window or window_samples(HRV_WINDOW_TIME, sample_freq)
+    hrv_step = hrv_step or window_samples(HRV_STEP_TIME, sample_freq)
+
+    ir_data = np.asarray(ir_data, dtype=np.float64)
+    red_data = np.asarray(red_data, dtype=np.float64)
+    n = len(ir_data)
+
+    results = {}
+
+    if n >= min(window, hrv_window):
+        sos, _ = get_bandpass(sample_freq)
+        ir_filtered = scipy.signal.sosfiltfilt(sos, ir_data)
+        candidates, props = scipy.signal.find_peaks(
+            ir_filtered, distance=_peak_distance(sample_freq), prominence=MIN_PROMINENCE)
+        prominences = props['prominences']
+    else:
+        ir_filtered = ir_data
+        candidates = np.empty(0, dtype=np.intp)
+        prominences = np.empty(0)
+    positions = _refine_peaks(ir_filtered, candidates)
+
+    def window_peaks(start, stop, threshold):
+        """Peak indices and sub-sample positions inside [start, stop)."""
+        lo, hi = np.searchsorted(candidates, [start, stop])
+        keep = prominences[lo:hi] >= threshold
+        return candidates[lo:hi][keep], positions[lo:hi][keep]
+
+    # HR and SpO2
+    starts = np.arange(0, n - window + 1, step) if n >= window else np.empty(0, dtype=np.intp)
+    thresholds = _window_thresholds(ir_filtered, starts, window) if len(starts) else np.empty(0)
+    hr = np.full(len(starts), -999.0)
+    hr_valid = np.zeros(len(starts), dtype=bool)
+    spo2 = np.full(len(starts), -999.0)
+    spo2_valid = np.zeros(len(starts), dtype=bool)
+
+    for i, (start, threshold) in enumerate(zip(starts.tolist(), thresholds.tolist())):
+        peaks, peak_positions = window_peaks(start, start + window, threshold)
+        if len(peaks) < 2:
+            continue
+        hr[i], hr_valid[i] = _hr_from_peaks(peak_positions, sample_freq)
+        ratios = _segment_ratios(ir_data, red_data, peaks)
+        if len(ratios) > 0:
+            spo2[i], spo2_valid[i] = _ratio_to_spo2(np.mean(ratios))
+
+    results['time'] = (starts + window) / sample_freq
+    results['hr'] = hr
+    results['hr_valid'] = hr_valid
+    results['spo2'] = spo2
+    results['spo2_valid'] = spo2_valid
+
+    # Rolling HRV
+    hrv_starts = (np.arange(0, n - hrv_window + 1, hrv_step)
+                  if n >= hrv_window else np.empty(0, dtype=np.intp))
+    hrv_thresholds = (_window_thresholds(ir_filtered, hrv_starts, hrv_window)
+                      if len(hrv_starts) else np.empty(0))
+    hrv_keys = ['rmssd', 'pnn50', 'mean_hr']
+    if extended:
+        hrv_keys += ['sdnn', 'sdsd', 'triangular_index', 'lf', 'hf', 'lf_hf']
+    hrv = {key: np.full(len(hrv_starts), -999.0) for key in hrv_keys}
+    hrv_valid = np.zeros(len(hrv_starts), dtype=bool)
+
+    for i, (start, threshold) in enumerate(zip(hrv_starts.tolist(), hrv_thresholds.tolist())):
+        _, peak_positions = window_peaks(start, start + hrv_window, threshold)
+        if extended:
+            metrics = calc_hrv_extended(peak_positions, sample_freq)
+        else:
+            metrics = calc_hrv_metrics(peak_positions, sample_freq)
+        if metrics['valid']:
+            for key in hrv:
+                hrv[key][i] = metrics[key]
+            hrv_valid[i] = True
+
+    results['hrv_time'] = (hrv_starts + hrv_window) / sample_freq
+    results.update(hrv)
+    results['hrv_valid'] = hrv_valid
+
+    return results
+
+
+class StreamingBandpass(object):
+    """
+    Causal heartbeat bandpass filter that keeps its state between calls.
+
+    Unlike the zero-phase sosfiltfilt used on whole windows, only the newly
+    arrived samples are filtered on each call. The output lags the input by
+    the filter group delay, which does not affect beat-to-beat intervals.
+    """
+
+    def __init__(self, sample_freq=SAMPLE_FREQ, band=FILTER_BAND, order=FILTER_ORDER):
+        self.sos, self._zi_step = get_bandpass(sample_freq, band, order)
+        self._zi = None
+
+    def process(self, samples):
+        """
+        Filter a batch of new samples.
+
+        Args:
+            samples: Array of new raw readings
+
+        Returns:
+            ndarray: Filtered samples, same length as the input
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        if len(x) == 0:
+            return x
+
+        if self._zi is None:
+            # start from steady state at the first sample to avoid a DC step
+            self._zi = self._zi_step * x[0]
+
+        y, self._zi = scipy.signal.sosfilt(self.sos, x, zi=self._zi)
+        return y
+
+    def reset(self):
+        """Forget the filter state, the next sample restarts the filter."""
+        self._zi = None
+
+
+class StreamingPeakDetector(object):
+    """
+    Incremental beat detector for a filtered PPG stream.
+
+    A local maximum is confirmed as a beat once the signal has fallen below
+    it by the dynamic prominence (10% of the range over the last `window`
+    samples) and it rose by the same amount from the preceding trough.
+    Beats closer than `distance` are thinned out like find_peaks(distance=...),
+    highest first, so confirmed beats are held back until no later beat
+    within `distance` can change the outcome.
+
+    A beat that follows the previous one by less than DICROTIC_INTERVAL_RATIO
+    of the last RR interval and is less than DICROTIC_HEIGHT_RATIO as high
+    (above the zero line of the bandpassed signal) is the dicrotic wave of
+    that beat and is dropped. At low heart rates it is further than
+    `distance` from the beat and would otherwise halve the RR intervals.
+
+    Peak positions are absolute sample positions since the last reset,
+    refined to sub-sample precision like _refine_peaks().
+    """
+
+    def __init__(self, sample_freq=SAMPLE_FREQ, distance=None, window=None,
+                 prominence_ratio=PEAK_PROMINENCE_RATIO, min_prominence=MIN_PROMINENCE,
+                 dicrotic_ratio=DICROTIC_HEIGHT_RATIO):
+        """
+        Args:
+            sample_freq: Sampling frequency in Hz
+            distance: Minimum samples between beats (default MIN_BEAT_INTERVAL)
+            window: Samples the dynamic prominence is taken over (default
+                WINDOW_TIME)
+            prominence_ratio: Prominence as a fraction of the window range
+            min_prominence: Lower bound of the prominence
+            dicrotic_ratio: Height relative to the previous beat below which
+                an early beat is dropped as its dicrotic wave, 0 to keep all
+                beats
+        """
+        self.distance = distance or _peak_distance(sample_freq)
+        self.window = window or window_samples(WINDOW_TIME, sample_freq)
+        self.prominence_ratio = prominence_ratio
+        self.min_prominence = min_prominence
+        self.dicrotic_ratio = dicrotic_ratio
+        self.reset()
+
+    def reset(self):
+        """Drop all detector state and restart sample numbering at 0."""
+        self.sample_count = 0
+        # monotonic queues of (index, value) for the sliding range
+        self._max_q = deque()
+        self._min_q = deque()
+        self._trough = np.inf
+        self._cand_idx = None
+        self._cand_val = None
+        self._cand_base = None
+        # neighbours of the candidate for the parabolic refinement
+        self._cand_left = None
+        self._cand_right = None
+        self._prev = None
+        # confirmed beats (index, value, position) each closer than
+        # `distance` to the one before, not yet emitted
+        self._held = []
+        # (position, value) of the last emitted beat and the RR interval
+        # before it, for dropping dicrotic waves
+        self._last_beat = None
+        self._last_interval = None
+
+    def _refined(self):
+        """Sub-sample position of the current candidate."""
+        left, right = self._cand_left, self._cand_right
+        if left is None or right is None:
+            return float(self._cand_idx)
+        denom = left - 2 * self._cand_val + right
+        if denom == 0:
+            return float(self._cand_idx)
+        offset = 0.5 * (left - right) / denom
+        return self._cand_idx + min(max(offset, -0.5), 0.5)
+
+    def _confirm(self, peaks):
+        """Hold the candidate as a beat, emitting the held beats it cannot affect."""
+        held = self._held
+        if held and self._cand_idx - held[-1][0] >= self.distance:
+            self._emit_held(peaks)
+        held.append((self._cand_idx, self._cand_val, self._refined()))
+
+    def _emit_held(self, peaks):
+        """Apply the distance rule to the held beats and emit the survivors."""
+        kept = []
+        # highest first, the later one of two equal beats wins like find_peaks
+        for beat in sorted(self._held, key=lambda beat: (beat[1], beat[0]), reverse=True):
+            if all(abs(beat[0] - other[0]) >= self.distance for other in kept):
+                kept.append(beat)
+        self._held = []
+
+        for _, value, position in sorted(kept):
+            last = self._last_beat
+            if last is not None:
+                interval = position - last[0]
+                if (self._last_interval is not None and
+                        interval < DICROTIC_INTERVAL_RATIO * self._last_interval and
+                        value < self.dicrotic_ratio * last[1]):
+                    continue
+                self._last_interval = interval
+            self._last_beat = (position, value)
+            peaks.append(position)
+
+    def update(self, filtered):
+        """
+        Feed a batch of filtered samples.
+
+        Args:
+            filtered: Array of new filtered samples
+
+        Returns:
+            ndarray: Fractional sample positions of beats confirmed by this
+                batch, `distance` samples after the last beat within
+                `distance` of them was detected
+        """
+        peaks = []
+        max_q = self._max_q
+        min_q = self._min_q
+
+        for v in np.asarray(filtered, dtype=np.float64).tolist():
+            i = self.sample_count
+            self.sample_count += 1
+
+            # sliding window max/min in O(1) amortised
+            while max_q and max_q[-1][1] <= v:
+                max_q.pop()
+            max_q.append((i, v))
+            while min_q and min_q[-1][1] >= v:
+                min_q.pop()
+            min_q.append((i, v))
+            oldest = i - self.window
+            if max_q[0][0] <= oldest:
+                max_q.popleft()
+            if min_q[0][0] <= oldest:
+                min_q.popleft()
+
+            threshold = max((max_q[0][1] - min_q[0][1]) * self.prominence_ratio,
+                            self.min_prominence)
+
+            # a candidate that has not dropped off within a whole window is
+            # not a beat (e.g. filter ringing after a step), start over here
+            if self._cand_idx is not None and i - self._cand_idx >= self.window:
+                self._cand_idx = None
+                self._trough = v
+
+            if self._cand_idx is None or v > self._cand_val:
+                self._cand_idx = i
+                self._cand_val = v
+                self._cand_base = self._trough
+                self._cand_left = self._prev
+                self._cand_right = None
+            elif i == self._cand_idx + 1:
+                self._cand_right = v
+
+            if i > self._cand_idx and self._cand_val - v >= threshold:
+                if self._cand_val - self._cand_base >= threshold:
+                    self._confirm(peaks)
+                # search for the next beat starting from this trough, also
+                # when the candidate did not rise far enough to be a beat
+                self._cand_idx = None
+                self._trough = v
+
+            if v < self._trough:
+                self._trough = v
+            self._prev = v
+
+            # the held beats are final once no candidate can join them
+            held = self._held
+            if (held and i - held[-1][0] >= self.distance and
+                    (self._cand_idx is None or self._cand_idx - held[-1][0] >= self.distance)):
+                self._emit_held(peaks)
+
+        return np.array(peaks, dtype=np.float64)
+
+    def flush(self):
+        """
+        Emit the beats held back for the distance rule, e.g. at the end of a
+        recording.
+
+        Returns:
+            ndarray: Positions of the held beats that survive, may be empty
+        """
+        peaks = []
+        self._emit_held(peaks)
+        return np.array(peaks, dtype=np.float64)
+
+
+class RunningHRV(object):
+    """
+    Incremental RMSSD, pNN50 and mean HR, updated in O(1) per beat.
+
+    Applies the same 300-2000 ms outlier filter as calc_hrv_metrics and gives
+    the same results for the same beats. With `window` set, only the RR
+    intervals in the latest `window` seconds are counted, for continuous
+    monitoring instead of a fixed collection.
+    """
+
+    def __init__(self, sample_freq=SAMPLE_FREQ, window=None):
+        """
+        Args:
+            sample_freq: Sampling frequency in Hz
+            window: Sliding window length in seconds, None to accumulate
+                every beat since the last reset
+        """
+        if window is not None and window <= 0:
+            raise ValueError("window must be positive")
+        self.sample_freq = sample_freq
+        self.window_ms = window * 1000.0 if window is not None else None
+        self._rr = deque()
+        self._diffs = deque()
+        self.reset()
+
+    def reset(self):
+        """Forget all beats."""
+        self.last_beat = None
+        self._rr.clear()
+        self._diffs.clear()
+        self._rr_sum = 0.0
+        self._ssd = 0.0
+        self._nn50 = 0
+
+    @property
+    def num_intervals(self):
+        """RR intervals currently counted."""
+        return len(self._rr)
+
+    def add_beat(self, position):
+        """
+        Add one beat.
+
+        Args:
+            position: Beat position in samples, increasing from call to call
+        """
+        last, self.last_beat = self.last_beat, position
+        if last is None:
+            return
+
+        rr = (position - last) / self.sample_freq * 1000
+        if not 300 <= rr <= 2000:
+            return
+
+        if self._rr:
+            diff = rr - self._rr[-1]
+            self._diffs.append(diff)
+            self._ssd += diff * diff
+            self._nn50 += abs(diff) > 50
+        self._rr.append(rr)
+        self._rr_sum += rr
+
+        if self.window_ms is not None:
+            while self._rr_sum > self.window_ms and len(self._rr) > 1:
+                self._rr_sum -= self._rr.popleft()
+                diff = self._diffs.popleft()
+                self._ssd -= diff * diff
+                self._nn50 -= abs(diff) > 50
+
+    def update(self, beats):
+        """Add a batch of beats, e.g. the output of StreamingPeakDetector.update()."""
+        for position in np.asarray(beats, dtype=np.float64).tolist():
+            self.add_beat(position)
+
+    def get_metrics(self):
+        """
+        Current HRV metrics.
+
+        Returns:
+            dict: Same keys as calc_hrv_metrics
+        """
+        num_rr = len(self._rr)
+        if num_rr < 2:
+            return {
+                'rmssd': -999,
+                'pnn50': -999,
+                'mean_hr': -999,
+                'num_intervals': 0,
+                'valid': False
+            }
+
+        num_diffs = len(self._diffs)
+        # the sliding sums can drift a hair below zero
+        rmssd = np.sqrt(max(self._ssd, 0.0) / num_diffs)
+        pnn50 = self._nn50 / num_diffs * 100
+        mean_hr = 60000 / (self._rr_sum / num_rr)
+
+        return {
+            'rmssd': round(rmssd, 2),
+            'pnn50': round(pnn50, 2),
+            'mean_hr': round(mean_hr, 1),
+            'num_intervals': num_rr,
+            'valid': True
+        }
@@ -0,0 +1,76 @@
+"""
+Interrupt pin abstraction for the MAX30102 INT line.
+
+The sensor pulls INT low when one of the enabled interrupts (A_FULL,
+PPG_RDY) fires and releases it once the status registers are read.
+HeartRateMonitor only needs to block until the next edge, so every pin
+implementation exposes the same `wait()` / `trigger()` pair and tests can
+drive a FakeInterruptPin by hand.
+"""
+
+import threading
+
+
+class InterruptPin(object):
+    """
+    Base interrupt pin backed by a threading.Event.
+
+    `trigger()` marks an edge as seen, `wait()` blocks until an edge arrives
+    (or the timeout expires) and consumes it.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def trigger(self, *args):
+        """Record an interrupt edge (also usable as a GPIO callback)."""
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """
+        Block until an interrupt edge is seen.
+
+        Args:
+            timeout: Maximum time to wait in seconds, None waits forever
+
+        Returns:
+            bool: True if an edge was seen, False on timeout
+        """
+        fired = self._event.wait(timeout)
+        self._event.clear()
+        return fired
+
+    def close(self):
+        """Release any resources held by the pin."""
+        pass
+
+
+class FakeInterruptPin(InterruptPin):
+    """Interrupt pin driven manually, for tests and off-device runs."""
+    pass
+
+
+class GPIOInterruptPin(InterruptPin):
+    """
+    Interrupt pin on a Raspberry Pi GPIO line.
+
+    INT is open-drain and active low, so the line is pulled up and a falling
+    edge means new data is waiting in the FIFO.
+    """
+
+    def __init__(self, pin, pull_up=True):
+        super(GPIOInterruptPin, self).__init__()
+        # imported lazily so the package stays importable off-device
+        import RPi.GPIO as GPIO
+
+        self._gpio = GPIO
+        self.pin = pin
+
+        GPIO.setmode(GPIO.BCM)
+        pull = GPIO.PUD_UP if pull_up else GPIO.PUD_OFF
+        GPIO.setup(pin, GPIO.IN, pull_up_down=pull)
+        GPIO.add_event_detect(pin, GPIO.FALLING, callback=self.trigger)
+
+    def close(self):
+        self._gpio.remove_event_detect(self.pin)
+        self._gpio.cleanup(self.pin)
@@ -2,9 +2,12 @@
 
 # this code is currently for python 2.7
 from __future__ import print_function
-from time import sleep
+from time import sleep, monotonic
+import numpy as np
 import smbus
 
+from .config import SensorConfig
+
 # register addresses
 REG_INTR_STATUS_1 = 0x00
 REG_INTR_STATUS_2 = 0x01
@@ -34,14 +37,57 @@ REG_PROX_INT_THRESH = 0x30
 REG_REV_ID = 0xFE
 REG_PART_ID = 0xFF
 
+# FIFO geometry
+FIFO_DEPTH = 32
+OVF_COUNTER_MAX = 0x1F
+BYTES_PER_SAMPLE = 6
+# SMBus block transfers are limited to 32 bytes, i.e. 5 whole samples
+I2C_BLOCK_MAX = 32
+SAMPLES_PER_BLOCK = I2C_BLOCK_MAX // BYTES_PER_SAMPLE
+
+
+def decode_samples(raw):
+    """
+    Decode raw FIFO bytes into red and IR readings.
+
+    Each sample is 2 x 3 bytes (red, ir), big endian, with the 18-bit value
+    in the low bits.
+
+    Returns two uint32 NumPy arrays (red_led, ir_led).
+    """
+    d = np.frombuffer(bytes(raw), dtype=np.uint8).reshape(-1, 2, 3).astype(np.uint32)
+    # mask MSB [23:18]
+    values = (d[:, :, 0] << 16 | d[:, :, 1] << 8 | d[:, :, 2]) & 0x03FFFF
+
+    return values[:, 0].copy(), values[:, 1].copy()
+
+
+def encode_samples(red, ir):
+    """
+    Encode red and IR readings into raw FIFO bytes, the inverse of
+    decode_samples().
+    """
+    values = np.column_stack((np.asarray(red), np.asarray(ir))).astype(np.uint32) & 0x03FFFF
+    d = np.stack((values >> 16, values >> 8, values), axis=-1).astype(np.uint8)
+    return d.tobytes()
+
 
 class MAX30102():
     # by default, this assumes that the device is at 0x57 on channel 1
-    def __init__(self, channel=1, address=0x57):
+    def __init__(self, channel=1, address=0x57, bus=None, config=None):
+        """
+        Args:
+            channel: I2C bus number
+            address: I2C address of the sensor
+            bus: Optional SMBus-compatible object to use instead of opening
+                smbus.SMBus(channel), e.g. a RecordingBus or ReplayBus
+            config: SensorConfig to apply in setup(), defaults to SensorConfig()
+        """
         #print("Channel: {0}, address: {1}".format(channel, address))
         self.address = address
         self.channel = channel
-        self.bus = smbus.SMBus(self.channel)
+        self.config = config if config is not None else SensorConfig()
+        self.bus = bus if bus is not None else smbus.SMBus(self.channel)
 
         self.reset()
 
@@ -66,10 +112,16 @@ class MAX30102():
         """
         self.bus.write_i2c_block_data(self.address, REG_MODE_CONFIG, [0x40])
 
-    def setup(self, led_mode=0x03):
+    def setup(self, led_mode=0x03, config=None):
         """
-        This will setup the device with the values written in sample Arduino code.
+        This will setup the device with the values from `config` (or the
+        config given to the constructor). The defaults are the values written
+        in sample Arduino code.
         """
+        if config is not None:
+            self.config = config
+        config = self.config
+
         # INTR setting
         # 0xc0 : A_FULL_EN and PPG_RDY_EN = Interrupt will be triggered when
         # fifo almost full & new fifo data ready
@@ -83,22 +135,22 @@ class MAX30102():
         # FIFO_RD_PTR[4:0]
         self.bus.write_i2c_block_data(self.address, REG_FIFO_RD_PTR, [0x00])
 
-        # 0b 0100 1111
-        # sample avg = 4, fifo rollover = false, fifo almost full = 17
-        self.bus.write_i2c_block_data(self.address, REG_FIFO_CONFIG, [0x4f])
+        # SMP_AVE[7:5], fifo rollover = false, FIFO_A_FULL[3:0]
+        # default 0x4f: sample avg = 4, fifo almost full = 17
+        self.bus.write_i2c_block_data(self.address, REG_FIFO_CONFIG, [config.fifo_config])
 
         # 0x02 for read-only, 0x03 for SpO2 mode, 0x07 multimode LED
         self.bus.write_i2c_block_data(self.address, REG_MODE_CONFIG, [led_mode])
-        # 0b 0010 0111
-        # SPO2_ADC range = 4096nA, SPO2 sample rate = 100Hz, LED pulse-width = 411uS
-        self.bus.write_i2c_block_data(self.address, REG_SPO2_CONFIG, [0x27])
+        # SPO2_ADC_RGE[6:5], SPO2_SR[4:2], LED_PW[1:0]
+        # default 0x27: SPO2_ADC range = 4096nA, SPO2 sample rate = 100Hz, LED pulse-width = 411uS
+        self.bus.write_i2c_block_data(self.address, REG_SPO2_CONFIG, [config.spo2_config])
 
-        # choose value for ~7mA for LED1
-        self.bus.write_i2c_block_data(self.address, REG_LED1_PA, [0x24])
-        # choose value for ~7mA for LED2
-        self.bus.write_i2c_block_data(self.address, REG_LED2_PA, [0x24])
-        # choose value fro ~25mA for Pilot LED
-        self.bus.write_i2c_block_data(self.address, REG_PILOT_PA, [0x7f])
+        # default 0x24 = ~7mA for LED1
+        self.bus.write_i2c_block_data(self.address, REG_LED1_PA, [config.led_pa])
+        # default 0x24 = ~7mA for LED2
+        self.bus.write_i2c_block_data(self.address, REG_LED2_PA, [config.led_pa])
+        # default 0x7f = ~25mA for Pilot LED
+        self.bus.write_i2c_block_data(self.address, REG_PILOT_PA, [config.pilot_pa])
 
     # this won't validate the arguments!
     # use when changing the values from default
@@ -117,6 +169,23 @@ class MAX30102():
                 num_samples += 32
             return num_samples
 
+    def get_fifo_status(self):
+        """
+        Read the FIFO write pointer, overflow counter and read pointer in a
+        single 3-byte transaction (registers 0x04-0x06 are contiguous).
+
+        Returns:
+            tuple: (num_samples, overflow) - samples waiting in the FIFO and
+                samples lost since the FIFO was last read
+        """
+        write_ptr, overflow, read_ptr = self.bus.read_i2c_block_data(
+            self.address, REG_FIFO_WR_PTR, 3)
+        num_samples = (write_ptr - read_ptr) % FIFO_DEPTH
+        if num_samples == 0 and overflow > 0:
+            # equal pointers with an overflow mean a full FIFO, not an empty one
+            num_samples = FIFO_DEPTH
+        return num_samples, overflow
+
     def read_fifo(self):
         """
         This function will read the data register.
@@ -137,6 +206,50 @@ class MAX30102():
 
         return red_led, ir_led
 
+    def read_fifo_burst(self, num_samples):
+        """
+        This function will read `num_samples` samples from the data register
+        in as few I2C transactions as possible.
+
+        The FIFO data register does not auto-increment, so consecutive block
+        reads of REG_FIFO_DATA keep popping samples. Each read is capped at the
+        SMBus block limit (5 samples = 30 bytes).
+
+        Returns two uint32 NumPy arrays (red_led, ir_led).
+        """
+        num_samples = min(max(int(num_samples), 0), FIFO_DEPTH)
+        if num_samples == 0:
+            empty = np.empty(0, dtype=np.uint32)
+            return empty, empty.copy()
+
+        # read & clear both interrupt status registers in one transaction
+        self.bus.read_i2c_block_data(self.address, REG_INTR_STATUS_1, 2)
+
+        raw = bytearray()
+        remaining = num_samples
+        while remaining > 0:
+            count = min(remaining, SAMPLES_PER_BLOCK)
+            raw.extend(self.bus.read_i2c_block_data(
+                self.address, REG_FIFO_DATA, count * BYTES_PER_SAMPLE))
+            remaining -= count
+
+        return decode_samples(raw)
+
+    def drain_fifo(self):
+        """
+        Read every sample waiting in the FIFO.
+
+        Returns:
+            tuple: (red_led, ir_led, overflow, timestamp) - uint32 arrays of
+                the samples, the number of samples the sensor dropped because
+                the FIFO was full (saturates at OVF_COUNTER_MAX), and the time.monotonic()
+                time of the read
+        """
+        num_samples, overflow = self.get_fifo_status()
+        timestamp = monotonic()
+        red, ir = self.read_fifo_burst(num_samples)
+        return red, ir, overflow, timestamp
+
     def read_sequential(self, amount=100):
         """
         This function will read the red-led and ir-led `amount` times.
@@ -146,13 +259,12 @@ class MAX30102():
         ir_buf = []
         count = amount
         while count > 0:
-            num_bytes = self.get_data_present()
-            while num_bytes > 0:
-                red, ir = self.read_fifo()
-
-                red_buf.append(red)
-                ir_buf.append(ir)
-                num_bytes -= 1
-                count -= 1
+            num_samples = min(self.get_data_present(), count)
+            if num_samples > 0:
+                red, ir = self.read_fifo_burst(num_samples)
+
+                red_buf.extend(red.tolist())
+                ir_buf.extend(ir.tolist())
+                count -= num_samples
 
         return red_buf, ir_buf
@@ -0,0 +1,273 @@
+"""
+Record and replay raw MAX30102 bus traffic.
+
+RecordingBus wraps a real smbus.SMBus and logs every register read (FIFO
+bytes, FIFO pointers, overflow counter, ...) with a timestamp to a compact
+binary file. ReplayBus loads such a file and emulates the sensor FIFO, so
+MAX30102 / HeartRateMonitor can run off-device, either at the recorded
+pace or as fast as possible.
+
+File layout (little endian):
+    header: b'MAXR', uint8 version
+    record: float64 timestamp (s since the first record), uint8 register,
+            uint16 length, `length` data bytes
+"""
+
+import struct
+import time
+from collections import deque
+
+import numpy as np
+
+from .max30102 import (
+    FIFO_DEPTH, BYTES_PER_SAMPLE, REG_INTR_STATUS_1, REG_FIFO_WR_PTR,
+    REG_OVF_COUNTER, REG_FIFO_RD_PTR, REG_FIFO_DATA, REG_FIFO_CONFIG,
+    REG_MODE_CONFIG, REG_PART_ID, encode_samples,
+)
+
+MAGIC = b'MAXR'
+VERSION = 1
+_HEADER = struct.Struct('<4sB')
+_RECORD = struct.Struct('<dBH')
+
+PART_ID = 0x15
+
+
+class RecordingBus(object):
+    """
+    SMBus wrapper that logs every read transaction to a file.
+
+    Writes are passed through and not recorded, the replay side only needs
+    what the sensor returned.
+    """
+
+    def __init__(self, bus, path):
+        self.bus = bus
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+        self._t0 = None
+
+    def _record(self, reg, data):
+        now = time.monotonic()
+        if self._t0 is None:
+            self._t0 = now
+        self._file.write(_RECORD.pack(now - self._t0, reg, len(data)))
+        self._file.write(bytes(data))
+
+    def read_i2c_block_data(self, addr, reg, length):
+        data = self.bus.read_i2c_block_data(addr, reg, length)
+        self._record(reg, data)
+        return data
+
+    def read_byte_data(self, addr, reg):
+        value = self.bus.read_byte_data(addr, reg)
+        self._record(reg, [value])
+        return value
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self.bus.write_i2c_block_data(addr, reg, data)
+
+    def write_byte_data(self, addr, reg, value):
+        self.bus.write_byte_data(addr, reg, value)
+
+    def close(self):
+        self._file.close()
+        self.bus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_recording(path):
+    """
+    Load a file written by RecordingBus.
+
+    Returns:
+        list: (timestamp, register, data bytes) tuples in recorded order
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    magic, version = _HEADER.unpack_from(raw, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a MAX30102 recording: {0}".format(path))
+
+    records = []
+    offset = _HEADER.size
+    while offset < len(raw):
+        t, reg, length = _RECORD.unpack_from(raw, offset)
+        offset += _RECORD.size
+        records.append((t, reg, raw[offset:offset + length]))
+        offset += length
+    return records
+
+
+def fifo_stream(records):
+    """
+    Extract the FIFO sample stream from recorded transactions.
+
+    Returns:
+        tuple: (samples, timestamps) with samples as an (N, 6) uint8 array of
+            raw FIFO bytes and the time each sample was read
+    """
+    chunks = []
+    times = []
+    for t, reg, data in records:
+        if reg == REG_FIFO_DATA:
+            count = len(data) // BYTES_PER_SAMPLE
+            chunks.append(data[:count * BYTES_PER_SAMPLE])
+            times.extend([t] * count)
+
+    samples = np.frombuffer(b''.join(chunks), dtype=np.uint8).reshape(-1, BYTES_PER_SAMPLE)
+    return samples, np.array(times, dtype=np.float64)
+
+
+class FifoBus(object):
+    """
+    SMBus stand-in that emulates the MAX30102 FIFO over a sample stream.
+
+    In real time mode sample k becomes available `timestamps[k]` seconds after
+    the first FIFO access; samples that find the 32-entry FIFO full are lost
+    and counted in REG_OVF_COUNTER, like the sensor with rollover disabled.
+    Otherwise the FIFO is refilled on every access, which runs the consumer
+    as fast as it can drain it. It is filled to one short of FIFO_DEPTH there,
+    since a completely full FIFO has equal read and write pointers.
+    """
+
+    def __init__(self, samples, timestamps=None, realtime=False, loop=False):
+        """
+        Args:
+            samples: (N, 6) uint8 array (or bytes) of raw FIFO samples
+            timestamps: Arrival time of each sample in seconds, required
+                for real time mode
+            realtime: Replay at the recorded pace instead of as fast as possible
+            loop: Start over from the first sample once the stream ends
+                (as fast as possible mode only)
+        """
+        if isinstance(samples, (bytes, bytearray)):
+            samples = np.frombuffer(samples, dtype=np.uint8)
+        self.samples = np.ascontiguousarray(samples, dtype=np.uint8).reshape(-1, BYTES_PER_SAMPLE)
+        if realtime and timestamps is None:
+            raise ValueError("real time replay needs sample timestamps")
+        self.timestamps = None if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+        self.realtime = realtime
+        self.loop = loop and not realtime
+
+        self._regs = {REG_PART_ID: PART_ID}
+        self._fifo = deque()
+        self._produced = 0  # samples taken from the stream
+        self._written = 0   # samples that made it into the FIFO
+        self._wr_ptr = 0
+        self._rd_ptr = 0
+        self._ovf = 0
+        self._cleared = 0
+        self._t0 = None
+
+    @classmethod
+    def from_samples(cls, red, ir, sample_freq=None, realtime=False, loop=False):
+        """Build a bus that serves the given red/IR readings."""
+        timestamps = None
+        if sample_freq is not None:
+            timestamps = np.arange(1, len(ir) + 1) / float(sample_freq)
+        return cls(encode_samples(red, ir), timestamps, realtime, loop)
+
+    @property
+    def exhausted(self):
+        """True once every sample has been read or lost."""
+        if self.loop:
+            return False
+        return self._produced == len(self.samples) and not self._fifo
+
+    @property
+    def dropped(self):
+        """Total number of samples lost to FIFO overflow or FIFO resets."""
+        return self._produced - self._written + self._cleared
+
+    def _advance(self):
+        if self.realtime:
+            if self._t0 is None:
+                self._t0 = time.monotonic() - self.timestamps[0] if len(self.timestamps) else 0
+            available = int(np.searchsorted(self.timestamps, time.monotonic() - self._t0, side='right'))
+        else:
+            available = self._produced + FIFO_DEPTH - 1 - len(self._fifo)
+            if not self.loop:
+                available = min(len(self.samples), available)
+
+        num_samples = len(self.samples)
+        for k in range(self._produced, available):
+            if len(self._fifo) < FIFO_DEPTH:
+                self._fifo.append(k % num_samples)
+                self._written += 1
+                self._wr_ptr = (self._wr_ptr + 1) % FIFO_DEPTH
+            else:
+                self._ovf = min(self._ovf + 1, 0x1f)
+        self._produced = max(self._produced, available)
+
+    def _read_register(self, reg):
+        pending = len(self._fifo)
+        if reg == REG_INTR_STATUS_1:
+            # A_FULL once FIFO_A_FULL empty slots are left, PPG_RDY if any data
+            a_full = FIFO_DEPTH - (self._regs.get(REG_FIFO_CONFIG, 0) & 0x0f)
+            return (0x80 if pending >= a_full else 0) | (0x40 if pending else 0)
+        if reg == REG_FIFO_WR_PTR:
+            return self._wr_ptr
+        if reg == REG_FIFO_RD_PTR:
+            return self._rd_ptr
+        if reg == REG_OVF_COUNTER:
+            return self._ovf
+        return self._regs.get(reg, 0)
+
+    def _reset_fifo(self):
+        self._cleared += len(self._fifo)
+        self._fifo.clear()
+        self._wr_ptr = self._rd_ptr = 0
+        self._ovf = 0
+
+    def read_i2c_block_data(self, addr, reg, length):
+        # only FIFO accesses move time forward, so setup() does not discard
+        # samples and the real time clock starts with the first drain
+        if reg <= REG_FIFO_DATA and reg + length > REG_FIFO_WR_PTR:
+            self._advance()
+        if reg != REG_FIFO_DATA:
+            return [self._read_register(reg + k) for k in range(length)]
+
+        count = min(length // BYTES_PER_SAMPLE, len(self._fifo))
+        indices = [self._fifo.popleft() for _ in range(count)]
+        if count:
+            self._rd_ptr = (self._rd_ptr + count) % FIFO_DEPTH
+            # popping a sample clears the overflow counter
+            self._ovf = 0
+        data = self.samples[indices].tobytes() if indices else b''
+        # the real FIFO returns stale data when read empty
+        return list(data) + [0] * (length - len(data))
+
+    def read_byte_data(self, addr, reg):
+        return self.read_i2c_block_data(addr, reg, 1)[0]
+
+    def write_i2c_block_data(self, addr, reg, data):
+        for k, value in enumerate(data):
+            self.write_byte_data(addr, reg + k, value)
+
+    def write_byte_data(self, addr, reg, value):
+        self._regs[reg] = value
+        if reg in (REG_FIFO_WR_PTR, REG_FIFO_RD_PTR, REG_OVF_COUNTER):
+            self._reset_fifo()
+        elif reg == REG_MODE_CONFIG and value & 0x40:
+            # soft reset clears all registers
+            self._regs = {REG_PART_ID: PART_ID}
+            self._reset_fifo()
+
+    def close(self):
+        pass
+
+
+class ReplayBus(FifoBus):
+    """FifoBus that serves the FIFO stream of a RecordingBus file."""
+
+    def __init__(self, path, realtime=False):
+        self.records = load_recording(path)
+        samples, timestamps = fifo_stream(self.records)
+        super(ReplayBus, self).__init__(samples, timestamps, realtime)
@@ -0,0 +1,131 @@
+"""
+Fixed-size, array-backed ring buffer for sensor sample windows.
+
+Samples are written twice, at `i` and `i + capacity`, so the current window
+is always one contiguous slice of the backing array and can be handed to
+NumPy/SciPy as a view without copying.
+"""
+
+import numpy as np
+
+
+# Overflow policies
+OVERFLOW_ROLL = 'roll'  # overwrite the oldest samples
+OVERFLOW_STOP = 'stop'  # drop new samples once full
+
+
+class RingBuffer(object):
+    """
+    Preallocated sliding window with O(1) append.
+
+    Once full, new samples either overwrite the oldest ones (OVERFLOW_ROLL)
+    or are dropped (OVERFLOW_STOP).
+    """
+
+    def __init__(self, capacity, dtype=np.float64, overflow=OVERFLOW_ROLL):
+        """
+        Args:
+            capacity: Maximum number of samples kept
+            dtype: NumPy dtype of the stored samples
+            overflow: OVERFLOW_ROLL or OVERFLOW_STOP
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if overflow not in (OVERFLOW_ROLL, OVERFLOW_STOP):
+            raise ValueError("unknown overflow policy: {0}".format(overflow))
+        self.capacity = int(capacity)
+        self.overflow = overflow
+        self._data = np.zeros(2 * self.capacity, dtype=dtype)
+        self._start = 0
+        self._len = 0
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def full(self):
+        return self._len == self.capacity
+
+    def __len__(self):
+        return self._len
+
+    def __array__(self, dtype=None, copy=None):
+        view = self.view()
+        if dtype is not None and dtype != view.dtype:
+            return view.astype(dtype)
+        if copy:
+            return view.copy()
+        return view
+
+    def append(self, value):
+        """
+        Append a single sample.
+
+        Returns:
+            int: Number of samples stored (0 if full and stopped)
+        """
+        cap = self.capacity
+        if self._len < cap:
+            pos = self._start + self._len
+            if pos >= cap:
+                pos -= cap
+            self._len += 1
+        elif self.overflow == OVERFLOW_STOP:
+            return 0
+        else:
+            pos = self._start
+            self._start = pos + 1 if pos + 1 < cap else 0
+        self._data[pos] = value
+        self._data[pos + cap] = value
+        return 1
+
+    def extend(self, values):
+        """
+        Append a batch of samples.
+
+        Returns:
+            int: Number of samples stored (less than given if full and stopped)
+        """
+        values = np.asarray(values)
+        cap = self.capacity
+        if self.overflow == OVERFLOW_STOP:
+            values = values[:cap - self._len]
+        n = len(values)
+        if n == 0:
+            return 0
+
+        if n >= cap:
+            self._data[:cap] = values[-cap:]
+            self._data[cap:] = values[-cap:]
+            self._start = 0
+            self._len = cap
+            return n
+
+        pos = (self._start + self._len + np.arange(n)) % cap
+        self._data[pos] = values
+        self._data[pos + cap] = values
+
+        total = self._len + n
+        if total > cap:
+            self._start = (self._start + total - cap) % cap
+            self._len = cap
+        else:
+            self._len = total
+        return n
+
+    def view(self):
+        """
+        Return the current window, oldest sample first, without copying.
+
+        The view is read-only and reflects later writes to the buffer, so copy
+        it if it has to outlive the next append.
+        """
+        view = self._data[self._start:self._start + self._len]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        """Drop all samples."""
+        self._start = 0
+        self._len = 0
@@ -0,0 +1,98 @@
+"""
+Low-overhead timing statistics for the sensor thread.
+
+Histograms use power-of-two buckets, so adding a value is a bit_length()
+and a list increment and memory use is fixed no matter how long the
+monitor runs.
+"""
+
+
+class Histogram(object):
+    """Histogram of non-negative values with power-of-two bucket bounds."""
+
+    NUM_BUCKETS = 32
+
+    def __init__(self, unit=''):
+        self.unit = unit
+        self.reset()
+
+    def reset(self):
+        self.buckets = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        # bucket i holds values in [2^(i-1), 2^i), bucket 0 holds [0, 1)
+        idx = int(value).bit_length()
+        if idx >= self.NUM_BUCKETS:
+            idx = self.NUM_BUCKETS - 1
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Upper bucket bound below which `q` percent of the values fall."""
+        if self.count == 0:
+            return None
+        target = self.count * q / 100.0
+        cumulative = 0
+        for idx, n in enumerate(self.buckets):
+            cumulative += n
+            if cumulative >= target:
+                return min(1 << idx, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'unit': self.unit,
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            # upper bound -> count, empty buckets left out
+            'buckets': {1 << idx: n for idx, n in enumerate(self.buckets) if n},
+        }
+
+
+class MonitorStats(object):
+    """Per-stage histograms and counters collected by HeartRateMonitor."""
+
+    def __init__(self):
+        self.bus_read = Histogram('us')
+        self.samples_per_drain = Histogram('samples')
+        self.dsp = Histogram('us')
+        self.loop_jitter = Histogram('us')
+        self.reset()
+
+    def reset(self):
+        self.bus_read.reset()
+        self.samples_per_drain.reset()
+        self.dsp.reset()
+        self.loop_jitter.reset()
+        self.drains = 0
+        self.empty_drains = 0
+        self.samples = 0
+        self.overflow_events = 0
+        self.overflow_samples = 0
+
+    def to_dict(self):
+        return {
+            'drains': self.drains,
+            'empty_drains': self.empty_drains,
+            'samples': self.samples,
+            'overflow_events': self.overflow_events,
+            'overflow_samples': self.overflow_samples,
+            'bus_read': self.bus_read.to_dict(),
+            'samples_per_drain': self.samples_per_drain.to_dict(),
+            'dsp': self.dsp.to_dict(),
+            'loop_jitter': self.loop_jitter.to_dict(),
+        }
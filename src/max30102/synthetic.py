@@ -0,0 +1,144 @@
+"""
+Synthetic PPG signal generator.
+
+Produces IR/red streams with known heart rate, RR intervals and SpO2 so
+hrcalc and the display can be benchmarked for speed and accuracy without a
+sensor. Signals can be fed through a FifoBus to exercise the full
+MAX30102 / HeartRateMonitor stack.
+"""
+
+import numpy as np
+
+from . import hrcalc
+from .replay import FifoBus
+
+# 18-bit ADC full scale
+ADC_MAX = 0x03FFFF
+
+
+def spo2_to_ratio(spo2):
+    """
+    Invert the hrcalc calibration curve.
+
+    Returns the ratio R = (AC_red/DC_red) / (AC_ir/DC_ir) that hrcalc maps to
+    `spo2`, taking the physiological branch (R falls as SpO2 rises).
+    """
+    a = -45.060 / 10000.0
+    b = 30.054 / 100.0
+    c = 94.845 - spo2
+    disc = b * b - 4 * a * c
+    if disc < 0:
+        raise ValueError("SpO2 of {0}% is above the calibration curve maximum".format(spo2))
+    ratio_scaled = (-b - np.sqrt(disc)) / (2 * a)
+    return ratio_scaled / 100.0
+
+
+def _pulse_shape(phase):
+    """Normalised PPG pulse (systolic peak + dicrotic wave) over one beat."""
+    systolic = np.exp(-((phase - 0.15) / 0.06) ** 2)
+    diastolic = 0.35 * np.exp(-((phase - 0.45) / 0.08) ** 2)
+    return systolic + diastolic
+
+
+def generate_ppg(duration, sample_freq=hrcalc.SAMPLE_FREQ, hr=70, hrv_ms=30, spo2=97,
+                 ir_dc=100000, ir_ac=2000, red_dc=90000, noise=50,
+                 wander=1000, wander_freq=0.25, motion_rate=0, motion_amplitude=5000,
+                 seed=None):
+    """
+    Generate a synthetic PPG recording with ground-truth labels.
+
+    Args:
+        duration: Length of the recording in seconds
+        sample_freq: Sampling frequency in Hz
+        hr: Mean heart rate in BPM
+        hrv_ms: Standard deviation of the RR intervals in ms
+        spo2: Target SpO2 in percent
+        ir_dc: IR baseline level (ADC counts)
+        ir_ac: IR pulse amplitude (ADC counts)
+        red_dc: Red baseline level (ADC counts)
+        noise: Standard deviation of white sensor noise (ADC counts)
+        wander: Baseline wander amplitude (ADC counts)
+        wander_freq: Baseline wander frequency in Hz (breathing)
+        motion_rate: Average number of motion artifacts per minute
+        motion_amplitude: Peak amplitude of motion artifacts (ADC counts)
+        seed: Seed for the random generator
+
+    Returns:
+        dict: 'ir' and 'red' uint32 arrays, plus ground truth: 'beat_times' (s),
+            'rr_intervals' (ms), 'hr' (mean BPM), 'spo2', 'ratio', 'motion'
+            (bool mask of samples hit by artifacts) and 'sample_freq'
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sample_freq)
+    t = np.arange(n) / sample_freq
+
+    # RR intervals, clipped to the 30-200 BPM range hrcalc accepts
+    mean_rr = 60000.0 / hr
+    num_beats = int(duration * 1000 / max(mean_rr - 3 * hrv_ms, 300)) + 2
+    rr = np.clip(rng.normal(mean_rr, hrv_ms, num_beats), 300, 2000)
+    beat_times = np.concatenate(([0.0], np.cumsum(rr) / 1000.0))
+    beat_times = beat_times[beat_times < duration]
+    rr = rr[:len(beat_times) - 1]
+
+    # phase of every sample within its beat
+    beat = np.searchsorted(beat_times, t, side='right') - 1
+    beat_start = beat_times[beat]
+    beat_len = np.append(rr / 1000.0, mean_rr / 1000.0)[beat]
+    pulse = _pulse_shape((t - beat_start) / beat_len)
+
+    ratio = spo2_to_ratio(spo2)
+    red_ac = ratio * (ir_ac / float(ir_dc)) * red_dc
+
+    # blood absorbs more light at systole, so the raw signal dips
+    ir = ir_dc - ir_ac * pulse
+    red = red_dc - red_ac * pulse
+
+    if wander:
+        baseline = np.sin(2 * np.pi * wander_freq * t + rng.uniform(0, 2 * np.pi))
+        ir = ir + wander * baseline
+        red = red + wander * (red_dc / float(ir_dc)) * baseline
+
+    motion = np.zeros(n, dtype=bool)
+    num_artifacts = rng.poisson(motion_rate * duration / 60.0) if motion_rate else 0
+    for center in rng.uniform(0, duration, num_artifacts):
+        width = rng.uniform(0.3, 1.5)
+        amplitude = motion_amplitude * rng.choice((-1, 1)) * rng.uniform(0.5, 1)
+        bump = amplitude * np.exp(-((t - center) / (width / 2)) ** 2)
+        ir = ir + bump
+        red = red + bump * (red_dc / float(ir_dc))
+        motion |= np.abs(t - center) < width
+
+    if noise:
+        ir = ir + rng.normal(0, noise, n)
+        red = red + rng.normal(0, noise, n)
+
+    return {
+        'ir': np.clip(np.rint(ir), 0, ADC_MAX).astype(np.uint32),
+        'red': np.clip(np.rint(red), 0, ADC_MAX).astype(np.uint32),
+        'beat_times': beat_times,
+        'rr_intervals': rr,
+        'hr': 60000.0 / np.mean(rr) if len(rr) else hr,
+        'spo2': spo2,
+        'ratio': ratio,
+        'motion': motion,
+        'sample_freq': sample_freq,
+    }
+
+
+def to_fifo_bus(signal, rate=None, realtime=False, loop=False):
+    """
+    Wrap a generated signal in a FifoBus for MAX30102 / HeartRateMonitor.
+
+    Args:
+        signal: Dict returned by generate_ppg()
+        rate: Rate in samples per second at which samples arrive in the
+            FIFO, defaults to the signal sample rate
+        realtime: Deliver samples at `rate` instead of as fast as possible
+        loop: Repeat the signal forever (as fast as possible mode only)
+
+    Returns:
+        FifoBus: Bus serving the signal
+    """
+    rate = signal['sample_freq'] if rate is None else rate
+    return FifoBus.from_samples(signal['red'], signal['ir'], sample_freq=rate, realtime=realtime,
+                                loop=loop)
@@ -1,6 +1,12 @@
 """
 Pulse oximeter main application.
 Entry point that continuously displays BPM/SpO2 and shows HRV when ready.
+
+The loop sleeps until the sensor thread publishes new results or the next
+heart animation frame is due. Animation frames run on fixed deadlines, so
+the frame rate does not depend on how long drawing takes. Changed readings
+are drawn right away. New waveform samples are picked up by the next
+animation frame.
 """
 import time
 from max30102 import HeartRateMonitor
@@ -9,52 +15,75 @@ from display import PulseDisplay
 from alarm_signals import AlarmSignals
 
 STABLE_THRESHOLD = 10
+ANIMATION_INTERVAL = 0.15  # seconds per heart animation frame
+
+
+def update_alarms(alarm, bpm, stable):
+    """Set buzzer and LEDs for the current BPM."""
+    # Only alarm after readings are stable
+    if not stable:
+        alarm.all_off()
+    elif bpm < 50 or bpm > 120:
+        alarm.buzzer_on()
+        alarm.red_led_on()
+        alarm.green_led_off()
+        alarm.yellow_led_off()
+    elif bpm > 90:
+        alarm.buzzer_off()
+        alarm.yellow_led_on()
+        alarm.red_led_off()
+        alarm.green_led_off()
+    else:
+        alarm.buzzer_off()
+        alarm.green_led_on()
+        alarm.red_led_off()
+        alarm.yellow_led_off()
+
 
 if __name__ == "__main__":
     hrm = HeartRateMonitor()
     hrm.start_sensor()
     display = PulseDisplay()
     alarm = AlarmSignals()
-    
+
     cached_hrv_results = None  # Stores HRV results to keep showing after calculation
     stable_readings = 0
-    
+    last_seq = None
+    drawn = None  # readings shown on the last frame
+    next_frame = time.monotonic()
+
     try:
         while True:
-            finger_present = hrm.bpm > 0
+            # sleep until new results or the next animation frame
+            snapshot = hrm.wait_for_update(last_seq, max(0, next_frame - time.monotonic()))
+            now = time.monotonic()
+            frame_due = now >= next_frame
+            if frame_due:
+                display.tick()
+                next_frame += ANIMATION_INTERVAL
+                if next_frame <= now:
+                    # fell behind, drop the missed frames instead of bunching them up
+                    next_frame = now + ANIMATION_INTERVAL
 
-            # Count stable readings (BPM in valid range)
-            if finger_present:
-                stable_readings += 1
-            else:
-                stable_readings = 0
-    
-            # Only alarm after readings are stable
-            if stable_readings >= STABLE_THRESHOLD:
-                if hrm.bpm < 50 or hrm.bpm > 120:
-                    alarm.buzzer_on()
-                    alarm.red_led_on()
-                    alarm.green_led_off()
-                    alarm.yellow_led_off()
-                elif hrm.bpm > 90:
-                    alarm.buzzer_off()
-                    alarm.yellow_led_on()
-                    alarm.red_led_off()
-                    alarm.green_led_off()
+            if snapshot.seq == last_seq and not frame_due:
+                continue
+            last_seq = snapshot.seq
+            finger_present = snapshot.bpm > 0
+
+            # Count stable readings (BPM in valid range) once per frame
+            if frame_due:
+                if finger_present:
+                    stable_readings += 1
                 else:
-                    alarm.buzzer_off()
-                    alarm.green_led_on()
-                    alarm.red_led_off()
-                    alarm.yellow_led_off()
-            else:
-                alarm.all_off()
-            
+                    stable_readings = 0
+                update_alarms(alarm, snapshot.bpm, stable_readings >= STABLE_THRESHOLD)
+
             # Clear cached results only when finger is removed
             if not finger_present:
                 cached_hrv_results = None
-            
-            if hrm.hrv_state == HRV_READY:
-                results = hrm.hrv_results
+
+            if snapshot.hrv_state == HRV_READY:
+                results = snapshot.hrv_results
                 if results and results.get('valid'):
                     cached_hrv_results = results
                     print(f"\n\nHRV Results:")
@@ -62,30 +91,34 @@ if __name__ == "__main__":
                     print(f"  pNN50: {results['pnn50']}%")
                     print(f"  Mean HR: {results['mean_hr']} BPM")
                 hrm.acknowledge_hrv()
-            
+
             if cached_hrv_results:
                 hrv_status = 'ready'
                 hrv_data = cached_hrv_results
-            elif hrm.hrv_state == HRV_COLLECTING:
+            elif snapshot.hrv_state == HRV_COLLECTING:
                 hrv_status = 'collecting'
-                _, _, percentage = hrm.get_hrv_progress()
+                _, _, percentage = snapshot.hrv_progress
                 hrv_data = round(percentage, 1)
             else:
                 hrv_status = 'idle'
                 hrv_data = None
-            
+
+            # skip the SPI transfer if nothing visible changed
+            readings = (int(snapshot.bpm), round(float(snapshot.spo), 2), hrv_status, hrv_data)
+            if not frame_due and readings == drawn:
+                continue
+            drawn = readings
+
             display.update_display(
-                bpm=hrm.bpm, 
-                spo=hrm.spo, 
-                hrv_status=hrv_status, 
+                bpm=snapshot.bpm,
+                spo=snapshot.spo,
+                hrv_status=hrv_status,
                 hrv_results=hrv_data,
-                raw_data=hrm.ir_data,
+                raw_data=snapshot.waveform,
             )
-            
-            time.sleep(0.1)
-            
+
     except KeyboardInterrupt:
         hrm.stop_sensor()
         display.cleanup()
         alarm.all_off()
-        alarm.cleanup()
\ No newline at end of file
+        alarm.cleanup()
@@ -0,0 +1,167 @@
+"""
+Regression tests for the streaming beat detector.
+
+StreamingPeakDetector must find the same beats as scipy.signal.find_peaks
+on the same (causally filtered) signal and must keep detecting after steps
+and motion artifacts. The beats PulseAnalyzer derives from it must match the
+RR intervals of the synthetic signal, live HRV included.
+
+Run with:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import scipy.signal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from max30102 import hrcalc  # noqa: E402
+from max30102.analyzer import PulseAnalyzer  # noqa: E402
+from max30102.synthetic import generate_ppg  # noqa: E402
+
+# Samples skipped at the start while the causal filter settles
+SETTLE = 4 * hrcalc.SAMPLE_FREQ
+
+
+def detect(ir, chunk=7):
+    """Filter `ir` causally and run the detector over it in small batches."""
+    filtered = hrcalc.StreamingBandpass().process(np.asarray(ir, dtype=np.float64))
+    detector = hrcalc.StreamingPeakDetector()
+    beats = [detector.update(filtered[i:i + chunk]) for i in range(0, len(filtered), chunk)]
+    beats.append(detector.flush())
+    return filtered, np.concatenate(beats)
+
+
+def reference(filtered, start):
+    """find_peaks with the detector's distance and the prominence of the clean signal."""
+    tail = filtered[start:]
+    prominence = hrcalc.PEAK_PROMINENCE_RATIO * (np.percentile(tail, 99) - np.percentile(tail, 1))
+    peaks, _ = scipy.signal.find_peaks(
+        filtered, distance=hrcalc._peak_distance(hrcalc.SAMPLE_FREQ), prominence=prominence)
+    return peaks[peaks >= start].astype(np.float64)
+
+
+def matched(beats, peaks, tolerance=1.5):
+    """Fraction of `beats` within `tolerance` samples of one of `peaks`."""
+    idx = np.clip(np.searchsorted(peaks, beats), 1, len(peaks) - 1)
+    dist = np.minimum(np.abs(peaks[idx] - beats), np.abs(peaks[idx - 1] - beats))
+    return np.mean(dist <= tolerance)
+
+
+def analyze(signal, chunk=7):
+    """Run `signal` through PulseAnalyzer in small batches, return its beats."""
+    analyzer = PulseAnalyzer(signal['sample_freq'])
+    ir, red = signal['ir'], signal['red']
+    beats = [analyzer.update(ir[i:i + chunk], red[i:i + chunk]) for i in range(0, len(ir), chunk)]
+    beats.append(analyzer.detector.flush())
+    return np.concatenate(beats)
+
+
+class StreamingPeakDetectorTest(unittest.TestCase):
+
+    def assertMatchesFindPeaks(self, filtered, beats, start, ratio):
+        peaks = reference(filtered, start)
+        beats = beats[beats >= start]
+        self.assertGreater(len(peaks), 0)
+        self.assertGreaterEqual(matched(beats, peaks), ratio)
+        self.assertGreaterEqual(matched(peaks, beats), ratio)
+
+    def test_steady_signal(self):
+        signal = generate_ppg(120, seed=1, noise=20)
+        filtered, beats = detect(signal['ir'])
+        self.assertMatchesFindPeaks(filtered, beats, SETTLE, 1.0)
+
+    def test_finger_placed_after_start(self):
+        # 10 s of an uncovered sensor, then the pulse on a much higher baseline
+        signal = generate_ppg(120, seed=1, noise=0)
+        gap = 10 * hrcalc.SAMPLE_FREQ
+        ir = np.concatenate((np.full(gap, 3000.0), signal['ir']))
+        filtered, beats = detect(ir)
+
+        # the step rings through the filter, compare once it has decayed
+        self.assertMatchesFindPeaks(filtered, beats, gap + 20 * hrcalc.SAMPLE_FREQ, 1.0)
+        self.assertGreater(beats[-1], len(ir) - 2 * hrcalc.SAMPLE_FREQ)
+
+    def test_motion_artifacts(self):
+        for seed in (0, 3):
+            signal = generate_ppg(300, motion_rate=2, motion_amplitude=8000, seed=seed, noise=20)
+            filtered, beats = detect(signal['ir'])
+            self.assertMatchesFindPeaks(filtered, beats, SETTLE, 0.98)
+            # detection must not stop after an artifact
+            self.assertGreater(beats[-1], len(filtered) - 2 * hrcalc.SAMPLE_FREQ)
+
+    def test_higher_peak_within_distance_wins(self):
+        x = np.zeros(60)
+        x[15:21] = [30, 60, 100, 60, 30, 0]
+        x[24:29] = [50, 100, 150, 100, 50]
+        x[40:45] = [50, 100, 120, 100, 50]
+        detector = hrcalc.StreamingPeakDetector(distance=10)
+        beats = np.concatenate((detector.update(x), detector.flush()))
+        peaks, _ = scipy.signal.find_peaks(x, distance=10, prominence=10)
+        np.testing.assert_allclose(beats, peaks)
+
+        # rising chain, 20 displaces 12 and is displaced by 28, which is far
+        # enough from 12 to keep it
+        x = np.zeros(45)
+        for idx, height in ((12, 100), (20, 120), (28, 150)):
+            x[idx - 2:idx + 3] = height * np.array([0.3, 0.6, 1, 0.6, 0.3])
+        detector = hrcalc.StreamingPeakDetector(distance=10)
+        beats = np.concatenate((detector.update(x), detector.flush()))
+        peaks, _ = scipy.signal.find_peaks(x, distance=10, prominence=10)
+        np.testing.assert_allclose(peaks, [12, 28])
+        np.testing.assert_allclose(beats, peaks)
+
+
+class PulseAnalyzerTest(unittest.TestCase):
+
+    def test_rr_intervals_match_ground_truth(self):
+        fs = hrcalc.SAMPLE_FREQ
+        for hr in (40, 60, 80, 100, 120):
+            signal = generate_ppg(120, hr=hr, seed=hr, noise=20)
+            beats = analyze(signal)
+            times = beats[beats >= SETTLE] / fs
+            beat_times = signal['beat_times']
+
+            # detected beats trail the true ones by the filter delay and the
+            # time to the systolic dip
+            lag = np.median(times - beat_times[np.searchsorted(beat_times, times) - 1])
+            nearest = np.abs(beat_times[:, np.newaxis] - (times - lag)).argmin(axis=0)
+
+            # exactly one detected beat per true beat, no dicrotic waves
+            np.testing.assert_array_equal(np.diff(nearest), 1, err_msg="{0} BPM".format(hr))
+            errors = np.diff(times) * 1000 - signal['rr_intervals'][nearest[:-1]]
+            self.assertLess(np.max(np.abs(errors)), 1000.0 / fs, "{0} BPM".format(hr))
+
+    def test_live_hrv(self):
+        # fed like HeartRateMonitor does during a 60 s collection
+        fs = hrcalc.SAMPLE_FREQ
+        start, stop = SETTLE, SETTLE + hrcalc.window_samples(60, fs)
+        for hr in (60, 80, 95, 120):
+            signal = generate_ppg(70, hr=hr, seed=hr, noise=20)
+            analyzer = PulseAnalyzer(fs)
+            live = hrcalc.RunningHRV(fs)
+            ir, red = signal['ir'], signal['red']
+            for i in range(0, len(ir), 7):
+                beats = analyzer.update(ir[i:i + 7], red[i:i + 7])
+                live.update(beats[(beats >= start) & (beats < stop)])
+            metrics = live.get_metrics()
+
+            # the live values at the end of the collection are the final ones
+            final = analyzer.get_hrv(start, stop)
+            self.assertEqual(metrics['num_intervals'], final['num_intervals'])
+            self.assertAlmostEqual(metrics['rmssd'], final['rmssd'], places=1)
+
+            # the systolic dip sits at a fixed phase of each synthetic beat,
+            # which smooths the RR series a little
+            beat_times = signal['beat_times']
+            rr = np.diff(beat_times[(beat_times >= start / fs) & (beat_times < stop / fs)]) * 1000
+            rmssd = np.sqrt(np.mean(np.diff(rr) ** 2))
+            self.assertLess(abs(metrics['rmssd'] - rmssd), 0.3 * rmssd, "{0} BPM".format(hr))
+
+
+if __name__ == '__main__':
+    unittest.main()